@@ -0,0 +1,175 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404, HttpResponse
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .authentication import CachedTokenAuthentication
+from .filters import search_ingredients
+from .renderers import SHOPPING_LIST_RENDERERS, ShoppingListNegotiation
+from .serializers import (IngredientSerializer, RecipeReadMaxSerializer,
+                          TagSerializer)
+from .shopping_cart import is_job_requested, job_status, start_job
+from .utils import (SHOP_CART_WRITERS, render_shop_cart, shop_cart_ingredients,
+                    shop_cart_rows, stream_shop_cart)
+from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+from recipes.models import Ingredient, Recipe, Tag
+
+authentication = CachedTokenAuthentication()
+
+renderer = JSONRenderer()
+
+negotiation = ShoppingListNegotiation()
+
+shopping_list_renderers = [renderer_class()
+                           for renderer_class in SHOPPING_LIST_RENDERERS]
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    """Ответ в формате JSON, как у Response из DRF."""
+    return HttpResponse(renderer.render(data), status=status,
+                        content_type=renderer.media_type)
+
+
+def error_response(exc):
+    """Ответ с ошибкой в формате обработчика исключений DRF."""
+    if isinstance(exc, Http404):
+        exc = exceptions.NotFound()
+    response = json_response({'detail': exc.detail}, exc.status_code)
+    if isinstance(exc, (exceptions.NotAuthenticated,
+                        exceptions.AuthenticationFailed)):
+        response['WWW-Authenticate'] = authentication.authenticate_header(
+            None
+        )
+    return response
+
+
+async def authenticate(request):
+    """
+    Аутентификация по токену из заголовка Authorization. Как и во
+    вьюсетах, пользователь из сессии не используется.
+    """
+    user_auth = await sync_to_async(authentication.authenticate)(request)
+    request.user = user_auth[0] if user_auth else AnonymousUser()
+
+
+def async_get(fallback):
+    """
+    Асинхронная обработка GET-запросов. Запросы с другими методами
+    обрабатывает синхронный view fallback в отдельном потоке, поэтому
+    изменение данных, ответы 405 и OPTIONS остаются как во вьюсетах.
+    """
+    fallback = sync_to_async(fallback)
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return await fallback(request, *args, **kwargs)
+            try:
+                await authenticate(request)
+                return await view(request, *args, **kwargs)
+            except (exceptions.APIException, Http404) as exc:
+                return error_response(exc)
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+def conditional_get(viewset):
+    """Условный GET-запрос с ETag вьюсета viewset, см. ConditionalGetMixin."""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            etag = await sync_to_async(viewset.get_etag)()
+            if viewset.is_not_modified(request, etag):
+                response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = await view(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+            return viewset.patch_conditional_headers(response, etag)
+        return wrapper
+    return decorator
+
+
+@async_get(TagViewSet.as_view({'get': 'list'}))
+@conditional_get(TagViewSet)
+async def tag_list(request):
+    """Список тегов."""
+    tags = [tag async for tag in Tag.objects.all()]
+    return json_response(TagSerializer(tags, many=True).data)
+
+
+@async_get(TagViewSet.as_view({'get': 'retrieve'}))
+@conditional_get(TagViewSet)
+async def tag_detail(request, pk):
+    """Тег по id."""
+    try:
+        tag = await Tag.objects.aget(pk=pk)
+    except Tag.DoesNotExist:
+        raise Http404
+    return json_response(TagSerializer(tag).data)
+
+
+@async_get(IngredientViewSet.as_view({'get': 'list'}))
+@conditional_get(IngredientViewSet)
+async def ingredient_list(request):
+    """
+    Поиск ингредиентов, см. search_ingredients. Индекс может
+    перестраиваться запросом к базе данных, поэтому поиск по нему
+    выполняется в потоке.
+    """
+    ingredients = await sync_to_async(search_ingredients)(
+        Ingredient.objects.all(), request.GET
+    )
+    if isinstance(ingredients, list):
+        return json_response(ingredients)
+    ingredients = [ingredient async for ingredient in ingredients]
+    return json_response(IngredientSerializer(ingredients, many=True).data)
+
+
+@async_get(RecipeViewSet.as_view({'get': 'retrieve', 'put': 'update',
+                                  'patch': 'partial_update',
+                                  'delete': 'destroy'}))
+async def recipe_detail(request, pk):
+    """Рецепт по id со связанными данными и флагами автора запроса."""
+    try:
+        recipe = await Recipe.objects.for_feed(request.user).aget(pk=pk)
+    except Recipe.DoesNotExist:
+        raise Http404
+    return json_response(
+        RecipeReadMaxSerializer(recipe, context={'request': request}).data
+    )
+
+
+@async_get(RecipeViewSet.as_view(
+    {'get': 'download_shopping_cart'},
+    **RecipeViewSet.download_shopping_cart.kwargs
+))
+async def download_shopping_cart(request):
+    """
+    Скачивание списка покупок, см. RecipeViewSet.download_shopping_cart.
+    PDF строится в потоке из общего пула, не занимая поток запроса.
+    Строки для текстовых форматов загружаются до ответа: при ASGI
+    потоковый ответ читается в цикле событий, где запросы к базе данных
+    недоступны.
+    """
+    if not request.user.is_authenticated:
+        raise exceptions.NotAuthenticated
+    renderer, _ = negotiation.select_renderer(Request(request),
+                                              shopping_list_renderers)
+    if renderer.format in SHOP_CART_WRITERS:
+        rows = [row async for row in shop_cart_rows(request.user)]
+        return stream_shop_cart(rows, renderer)
+    ingredients = [ingredient async for ingredient
+                   in shop_cart_ingredients(request.user)]
+    if is_job_requested(request):
+        job_id, ready = await sync_to_async(start_job)(request.user,
+                                                       ingredients)
+        return json_response(*job_status(request, job_id, ready))
+    return await sync_to_async(render_shop_cart,
+                               thread_sensitive=False)(ingredients)
@@ -0,0 +1,58 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.authentication import TokenAuthentication
+
+CACHED_USER_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name',
+                      'is_active', 'is_staff', 'is_superuser')
+
+
+def get_token_cache_key(key):
+    """Ключ кэша для токена. В ключе хранится хэш, а не сам токен."""
+    return 'auth-token:{}'.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def forget_tokens(keys):
+    """Удаление пользователей токенов keys из кэша."""
+    cache.delete_many([get_token_cache_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену с хранением полей CACHED_USER_FIELDS
+    пользователя токена в кэше на TOKEN_CACHE_TIMEOUT секунд. Хэш пароля
+    в кэш не попадает: пользователь из кэша создаётся с отложенными
+    остальными полями, они загружаются из базы данных при обращении,
+    а save() сохраняет только загруженные поля.
+    Записи кэша удаляются сигналами после выхода, удаления токена или
+    сохранения пользователя. QuerySet.update() и bulk_update() сигналов
+    не отправляют: изменения, сделанные ими, например блокировка
+    пользователей, вступают в силу через TOKEN_CACHE_TIMEOUT секунд, если
+    не удалить токены из кэша функцией forget_tokens.
+    С кэшем в памяти процесса (LocMemCache, по умолчанию без CACHE_BACKEND)
+    записи удаляются только в процессе, где изменился пользователь,
+    остальные процессы сервера видят изменения через TOKEN_CACHE_TIMEOUT
+    секунд. В docker compose используется общий кэш Redis.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = get_token_cache_key(key)
+        values = cache.get(cache_key)
+        if values is not None:
+            user = self.get_cached_user(values)
+            return user, self.get_model()(key=key, user=user)
+        user, token = super().authenticate_credentials(key)
+        values = {field: getattr(user, field) for field in CACHED_USER_FIELDS}
+        cache.set(cache_key, values, settings.TOKEN_CACHE_TIMEOUT)
+        return user, token
+
+    def get_cached_user(self, values):
+        """Пользователь из полей values, остальные поля отложены."""
+        model = get_user_model()
+        names = [field.attname for field in model._meta.concrete_fields
+                 if field.attname in values]
+        return model.from_db(DEFAULT_DB_ALIAS, names,
+                             [values[name] for name in names])
@@ -1,37 +1,159 @@
-from django_filters import rest_framework as filters
-from rest_framework.filters import SearchFilter
-
-from recipes.models import Recipe, Tag
-
-
-class IngredientSearchFilter(SearchFilter):
-    """Кастомный поисковый фильтр для ингредиентов. Замена параметра
-    search на параметр name."""
-    search_param = 'name'
-
-
-class RecipeFilter(filters.FilterSet):
-    """Кастомный фильтр для рецептов."""
-    tags = filters.ModelMultipleChoiceFilter(queryset=Tag.objects.all(),
-                                             field_name='tags__slug',
-                                             to_field_name='slug')
-    is_favorited = filters.BooleanFilter(method='get_is_favorited')
-    is_in_shopping_cart = filters.BooleanFilter(
-        method='get_is_in_shopping_cart'
-    )
-
-    class Meta:
-        model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
-
-    def get_is_favorited(self, queryset, name, value):
-        """Метод вывода избранных рецептов автора запроса."""
-        if self.request.user.is_authenticated and value:
-            return queryset.filter(favorite__user=self.request.user)
-        return queryset
-
-    def get_is_in_shopping_cart(self, queryset, name, value):
-        """Метод вывода рецептов из списка покупок автора запроса."""
-        if self.request.user.is_authenticated and value:
-            return queryset.filter(shoplist__user=self.request.user)
-        return queryset
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django_filters import rest_framework as filters
+from rest_framework.filters import SearchFilter
+
+from recipes.cache import get_generation
+from recipes.models import Ingredient, Recipe, Tag, TagRecipe
+
+
+class IngredientSearchFilter(SearchFilter):
+    """Кастомный поисковый фильтр для ингредиентов. Замена параметра
+    search на параметр name и поиск вхождения в любую часть названия."""
+    search_param = 'name'
+
+    def filter_queryset(self, request, queryset, view):
+        name = request.query_params.get(self.search_param, '').strip()
+        if not name:
+            return queryset
+        return queryset.search(name)
+
+
+class IngredientPrefixIndex:
+    """
+    Индекс ингредиентов в памяти процесса для поиска по началу названия.
+    Хранит отсортированный список названий в нижнем регистре и ищет по нему
+    двоичным поиском. Строится при первом запросе и перестраивается после
+    изменения ингредиентов или по истечении ttl секунд. Изменения
+    отслеживаются по общему для процессов счётчику generation в кэше,
+    поэтому индекс перестраивается во всех процессах сервера, а не только
+    в том, где изменились ингредиенты.
+    """
+    generation = 'ingredients'
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.built_generation = None
+        self.built_at = 0
+        self.data = ((), ())
+
+    def is_stale(self):
+        """Проверка, нужно ли перестроить индекс."""
+        return (self.built_generation != get_generation(self.generation)
+                or time.monotonic() - self.built_at > self.ttl)
+
+    def build(self):
+        """
+        Загрузка всех ингредиентов из базы данных. Значение счётчика
+        читается до загрузки: изменение во время загрузки снова сделает
+        индекс устаревшим.
+        """
+        generation = get_generation(self.generation)
+        rows = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda row: (row['name'].lower(), row['id'])
+        )
+        self.data = (tuple(row['name'].lower() for row in rows), tuple(rows))
+        self.built_at = time.monotonic()
+        self.built_generation = generation
+
+    def search(self, prefix, limit=None):
+        """
+        Ингредиенты, название которых начинается с prefix, а за ними
+        ингредиенты, содержащие prefix в середине названия. Возвращает None,
+        если индекс устарел и перестраивается в другом потоке: тогда поиск
+        нужно выполнить запросом к базе данных.
+        """
+        if self.is_stale():
+            if not self.lock.acquire(blocking=False):
+                return None
+            try:
+                self.build()
+            finally:
+                self.lock.release()
+        names, rows = self.data
+        prefix = prefix.lower()
+        start = bisect_left(names, prefix)
+        end = bisect_right(names, prefix + chr(0x10FFFF), lo=start)
+        found = list(rows[start:end])
+        if limit is None or len(found) < limit:
+            found.extend(
+                row for row, name in zip(rows, names)
+                if prefix in name and not name.startswith(prefix)
+            )
+        return found[:limit]
+
+
+ingredient_index = IngredientPrefixIndex(settings.INGREDIENT_INDEX_TTL)
+
+
+def search_ingredients(queryset, query_params):
+    """
+    Поиск ингредиентов по параметру name: по индексу в памяти процесса,
+    а пока индекс перестраивается - запросом к базе данных. Параметр limit
+    ограничивает количество найденных ингредиентов. Возвращает список
+    найденных ингредиентов из индекса или QuerySet.
+    """
+    limit = query_params.get('limit')
+    limit = int(limit) if limit and limit.isdigit() else None
+    name = query_params.get(IngredientSearchFilter.search_param, '').strip()
+    if name:
+        ingredients = ingredient_index.search(name, limit)
+        if ingredients is not None:
+            return ingredients
+        queryset = queryset.search(name)
+    return queryset[:limit]
+
+
+class RecipeFilter(filters.FilterSet):
+    """Кастомный фильтр для рецептов."""
+    tags = filters.ModelMultipleChoiceFilter(queryset=Tag.objects.all(),
+                                             field_name='tags__slug',
+                                             to_field_name='slug',
+                                             method='get_tags')
+    is_favorited = filters.BooleanFilter(method='get_is_favorited')
+    is_in_shopping_cart = filters.BooleanFilter(
+        method='get_is_in_shopping_cart'
+    )
+    search = filters.CharFilter(method='get_search')
+
+    class Meta:
+        model = Recipe
+        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'search')
+
+    def get_tags(self, queryset, name, value):
+        """
+        Метод вывода рецептов хотя бы с одним из выбранных тегов.
+        Подзапрос EXISTS не размножает рецепты с несколькими тегами,
+        поэтому не нужен DISTINCT.
+        """
+        if not value:
+            return queryset
+        return queryset.filter(Exists(TagRecipe.objects.filter(
+            recipe=OuterRef('pk'), tag__in=value
+        )))
+
+    def get_is_favorited(self, queryset, name, value):
+        """Метод вывода избранных рецептов автора запроса."""
+        if self.request.user.is_authenticated and value:
+            return queryset.filter(favorite__user=self.request.user)
+        return queryset
+
+    def get_is_in_shopping_cart(self, queryset, name, value):
+        """Метод вывода рецептов из списка покупок автора запроса."""
+        if self.request.user.is_authenticated and value:
+            return queryset.filter(shoplist__user=self.request.user)
+        return queryset
+
+    def get_search(self, queryset, name, value):
+        """Метод поиска рецептов по названию и описанию."""
+        value = value.strip()
+        if value:
+            return queryset.search(value)
+        return queryset
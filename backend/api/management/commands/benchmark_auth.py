@@ -0,0 +1,103 @@
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+
+from api.authentication import CachedTokenAuthentication
+from users.models import User
+
+AUTHENTICATION_CLASSES = (
+    ('TokenAuthentication', TokenAuthentication),
+    ('CachedTokenAuthentication', CachedTokenAuthentication),
+)
+
+
+class Rollback(Exception):
+    """Отмена транзакции с токеном для замеров."""
+
+
+class Command(BaseCommand):
+
+    help = ('Сравнение количества запросов в секунду к эндпоинтам '
+            'с аутентификацией по токену с загрузкой пользователя из '
+            'базы данных и из кэша. Токен создаётся в транзакции, которая '
+            'отменяется после замеров')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user',
+                            help='username пользователя, от имени которого '
+                                 'выполняются запросы. По умолчанию - '
+                                 'первый активный пользователь')
+        parser.add_argument('--urls', nargs='+',
+                            default=('/api/users/me/', '/api/tags/',
+                                     '/api/recipes/?limit=6'),
+                            help='Адреса для замеров')
+        parser.add_argument('--requests', type=int, default=300,
+                            help='Количество запросов для каждого адреса '
+                                 'и способа аутентификации')
+
+    def get_user(self, username):
+        """Пользователь, от имени которого выполняются запросы."""
+        users = User.objects.filter(is_active=True).order_by('pk')
+        if username:
+            users = users.filter(username=username)
+        user = users.first()
+        if user is None:
+            raise CommandError('Активный пользователь не найден')
+        return user
+
+    def measure(self, client, url, count):
+        """
+        Количество запросов к базе данных одного ответа и ответов в секунду
+        для count запросов по адресу url. Первый запрос, загружающий
+        пользователя токена в кэш, не учитывается.
+        """
+        response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f'GET {url}: {response.status_code}')
+        with CaptureQueriesContext(connection) as context:
+            client.get(url)
+        queries = len(context.captured_queries)
+        start = time.perf_counter()
+        for _ in range(count):
+            client.get(url)
+        return queries, count / (time.perf_counter() - start)
+
+    def run(self, kwargs):
+        user = self.get_user(kwargs['user'])
+        token, _ = Token.objects.get_or_create(user=user)
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS
+                     if host != '*'), 'localhost')
+        client = APIClient(HTTP_HOST=host,
+                           HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.stdout.write(f'Пользователь: {user.username}')
+        header = (f'{"Адрес":30} {"Аутентификация":26} {"Запросов":>8} '
+                  f'{"Ответов/с":>10}')
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for url in kwargs['urls']:
+            for label, authentication_class in AUTHENTICATION_CLASSES:
+                cache.clear()
+                with mock.patch.object(APIView, 'authentication_classes',
+                                       (authentication_class,)):
+                    queries, rate = self.measure(client, url,
+                                                 kwargs['requests'])
+                self.stdout.write(
+                    f'{url:30} {label:26} {queries:8} {rate:10.0f}'
+                )
+
+    def handle(self, *args, **kwargs):
+        try:
+            with transaction.atomic():
+                self.run(kwargs)
+                raise Rollback
+        except Rollback:
+            pass
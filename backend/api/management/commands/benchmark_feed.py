@@ -0,0 +1,143 @@
+import statistics
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.pagination import FoodgramCursorPagination
+from recipes.models import Recipe, Tag
+from users.models import User
+
+FEED_URL = '/api/recipes/'
+
+
+class Command(BaseCommand):
+
+    help = ('Замер количества запросов к базе данных и времени ответа '
+            'ленты рецептов при разных параметрах. Перед каждым запросом '
+            'кэш очищается, чтобы ответ строился из базы данных')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='username пользователя, от имени которого выполняются '
+                 'запросы. По умолчанию - пользователь с наибольшим '
+                 'количеством подписок'
+        )
+        parser.add_argument('--anonymous', action='store_true',
+                            help='Запросы без аутентификации')
+        parser.add_argument('--limits', type=int, nargs='+',
+                            default=(6, 24, 60, 120),
+                            help='Размеры страницы ленты')
+        parser.add_argument('--search', nargs='+', default=(),
+                            help='Поисковые запросы для замера поиска '
+                                 'рецептов с сортировкой по релевантности')
+        parser.add_argument('--tags', type=int, nargs='+', default=(),
+                            help='Количество тегов в фильтре ленты по '
+                                 'тегам: выбираются первые теги')
+        parser.add_argument('--pages', type=int, nargs='+', default=(),
+                            help='Номера страниц для сравнения пагинации '
+                                 'по номеру страницы и по курсору')
+        parser.add_argument('--page-size', type=int, default=6,
+                            help='Размер страницы для --pages')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Количество повторов каждого запроса')
+
+    def get_user(self, username):
+        """Пользователь, от имени которого выполняются запросы."""
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь {username} не найден')
+        user = User.objects.annotate(
+            followings_count=Count('follower')
+        ).order_by('-followings_count', 'pk').first()
+        if user is None:
+            raise CommandError('В базе данных нет пользователей')
+        return user
+
+    def get_scenarios(self, options):
+        """Пары (название, адрес с параметрами) для замеров."""
+        scenarios = [(f'limit={limit}', f'{FEED_URL}?limit={limit}')
+                     for limit in options['limits']]
+        scenarios.extend(
+            (f'search={text}', f'{FEED_URL}?{urlencode({"search": text})}')
+            for text in options['search']
+        )
+        slugs = list(Tag.objects.values_list('slug', flat=True))
+        for count in options['tags']:
+            if count > len(slugs):
+                raise CommandError(f'В базе данных меньше {count} тегов')
+            query = urlencode([('tags', slug) for slug in slugs[:count]])
+            scenarios.append((f'тегов: {count}', f'{FEED_URL}?{query}'))
+        page_size = options['page_size']
+        for page in options['pages']:
+            page_query = urlencode({'page': page, 'limit': page_size})
+            cursor_query = urlencode({
+                'cursor': self.get_cursor(page, page_size),
+                'limit': page_size
+            })
+            scenarios.append((f'page={page}', f'{FEED_URL}?{page_query}'))
+            scenarios.append((f'cursor, страница {page}',
+                              f'{FEED_URL}?{cursor_query}'))
+        return scenarios
+
+    def get_cursor(self, page, page_size):
+        """Курсор, с которого начинается страница page ленты."""
+        if page == 1:
+            return ''
+        paginator = FoodgramCursorPagination()
+        queryset = Recipe.objects.all()
+        paginator.ordering = paginator.get_ordering(queryset)
+        index = (page - 1) * page_size - 1
+        previous = list(
+            queryset.order_by(*paginator.ordering)[index:index + 1]
+        )
+        if not previous:
+            raise CommandError(f'В ленте нет страницы {page}')
+        return paginator.make_cursor(paginator.get_values(previous[0]), False)
+
+    def measure(self, client, url, repeat):
+        """
+        Количество запросов к базе данных и время ответов в миллисекундах
+        для repeat запросов по адресу url.
+        """
+        timings = []
+        for _ in range(repeat):
+            cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f'GET {url}: {response.status_code}')
+        return len(context.captured_queries), timings
+
+    def handle(self, *args, **kwargs):
+        if not Recipe.objects.exists():
+            raise CommandError('В базе данных нет рецептов')
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS
+                     if host != '*'), 'localhost')
+        client = APIClient(HTTP_HOST=host)
+        if not kwargs['anonymous']:
+            user = self.get_user(kwargs['user'])
+            client.force_authenticate(user)
+            self.stdout.write(f'Пользователь: {user.username}')
+        header = (f'{"Параметры":40} {"Запросов":>8} {"min":>8} '
+                  f'{"median":>8} {"max":>8}')
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for label, url in self.get_scenarios(kwargs):
+            queries, timings = self.measure(client, url, kwargs['repeat'])
+            self.stdout.write(
+                f'{label:40} {queries:8} {min(timings):8.1f} '
+                f'{statistics.median(timings):8.1f} {max(timings):8.1f}'
+            )
+        self.stdout.write('Время ответа в миллисекундах')
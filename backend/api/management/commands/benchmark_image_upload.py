@@ -0,0 +1,92 @@
+import base64
+import io
+import math
+import os
+import statistics
+import time
+import tracemalloc
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+from rest_framework import serializers
+
+from api.serializers import Base64ImageField
+
+
+def make_image(size):
+    """
+    Изображение PNG из случайных пикселей размером около size байт:
+    такие данные не сжимаются, и размер файла близок к размеру пикселей.
+    """
+    side = int(math.sqrt(size / 3))
+    image = Image.frombytes('RGB', (side, side), os.urandom(side * side * 3))
+    output = io.BytesIO()
+    image.save(output, 'PNG', compress_level=1)
+    return output.getvalue()
+
+
+def decode_whole(data):
+    """Декодирование всего текста base64 сразу в файл в памяти."""
+    header, encoded = data.split(';base64,')
+    return serializers.ImageField().to_internal_value(
+        ContentFile(base64.b64decode(encoded), name='temp.png')
+    )
+
+
+def decode_chunks(data):
+    """Декодирование частями полем Base64ImageField."""
+    return Base64ImageField().to_internal_value(data)
+
+
+class Command(BaseCommand):
+
+    help = ('Замер времени и пиковой памяти декодирования изображения '
+            'рецепта из data URI целиком и частями полем Base64ImageField')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=float, nargs='+',
+                            default=(1, 5, 9),
+                            help='Размеры изображений в мегабайтах')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Количество повторов для замера времени')
+
+    def measure(self, decode, data, repeat):
+        """Медиана времени в миллисекундах и пик памяти Python в байтах."""
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            decode(data).close()
+            timings.append((time.perf_counter() - start) * 1000)
+        tracemalloc.start()
+        decode(data).close()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return statistics.median(timings), peak
+
+    def handle(self, *args, **kwargs):
+        methods = (('целиком', decode_whole), ('частями', decode_chunks))
+        header = (f'{"Способ":10} {"Размер, МБ":>10} {"median, мс":>10} '
+                  f'{"Пик Python, МБ":>14}')
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for size in sorted(kwargs['sizes']):
+            image = make_image(size * 1024 * 1024)
+            data = ('data:image/png;base64,'
+                    + base64.b64encode(image).decode())
+            for label, decode in methods:
+                try:
+                    median, peak = self.measure(decode, data,
+                                                kwargs['repeat'])
+                except serializers.ValidationError as error:
+                    raise CommandError(f'{size} МБ: {error.detail}')
+                self.stdout.write(
+                    f'{label:10} {len(image) / 1024 / 1024:10.1f} '
+                    f'{median:10.1f} {peak / 1024 / 1024:14.1f}'
+                )
+        self.stdout.write(
+            'Пик Python - наибольший объём памяти, выделенной во время '
+            'декодирования и проверки изображения (tracemalloc), без '
+            'текста запроса. Изображения больше FILE_UPLOAD_MAX_MEMORY_SIZE '
+            'Base64ImageField записывает во временный файл.'
+        )
@@ -0,0 +1,102 @@
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.filters import ingredient_index, search_ingredients
+from api.serializers import IngredientSerializer
+from recipes.models import Ingredient
+
+INGREDIENTS_URL = '/api/ingredients/'
+
+
+class Command(BaseCommand):
+
+    help = ('Сравнение количества поисков ингредиентов в секунду: фильтр '
+            'name__istartswith, поиск запросом к базе данных и поиск по '
+            'индексу в памяти процесса, а также запросы к API с индексом')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefixes', nargs='+',
+                            default=('с', 'мо', 'кар', 'сливоч'),
+                            help='Начала названий для поиска')
+        parser.add_argument('--limit', type=int,
+                            help='Параметр limit поиска')
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Количество поисков для каждого способа '
+                                 'и начала названия')
+
+    def get_methods(self, limit):
+        """Пары (название, функция поиска по началу названия)."""
+        queryset = Ingredient.objects.all()
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS
+                     if host != '*'), 'localhost')
+        client = APIClient(HTTP_HOST=host)
+        params = {} if limit is None else {'limit': str(limit)}
+
+        def istartswith(prefix):
+            return IngredientSerializer(
+                queryset.filter(name__istartswith=prefix)[:limit], many=True
+            ).data
+
+        def database(prefix):
+            return IngredientSerializer(
+                queryset.search(prefix)[:limit], many=True
+            ).data
+
+        def index(prefix):
+            return search_ingredients(queryset, {'name': prefix, **params})
+
+        def api(prefix):
+            response = client.get(
+                f'{INGREDIENTS_URL}?{urlencode({"name": prefix, **params})}'
+            )
+            if response.status_code != 200:
+                raise CommandError(
+                    f'GET {INGREDIENTS_URL}: {response.status_code}'
+                )
+            return response.data
+
+        return (
+            ('name__istartswith', istartswith),
+            ('search, база данных', database),
+            ('индекс', index),
+            ('API, индекс', api),
+        )
+
+    def measure(self, method, prefix, count):
+        """
+        Количество запросов к базе данных на поиск, поисков в секунду
+        и количество найденных ингредиентов.
+        """
+        with CaptureQueriesContext(connection) as context:
+            found = method(prefix)
+        start = time.perf_counter()
+        for _ in range(count):
+            method(prefix)
+        rate = count / (time.perf_counter() - start)
+        return len(context.captured_queries), rate, len(found)
+
+    def handle(self, *args, **kwargs):
+        if not Ingredient.objects.exists():
+            raise CommandError('В базе данных нет ингредиентов')
+        if ingredient_index.search('') is None:
+            raise CommandError('Индекс ингредиентов перестраивается')
+        header = (f'{"Способ":20} {"Начало":10} {"Найдено":>8} '
+                  f'{"Запросов":>8} {"Поисков/с":>10}')
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for prefix in kwargs['prefixes']:
+            for label, method in self.get_methods(kwargs['limit']):
+                queries, rate, found = self.measure(method, prefix,
+                                                    kwargs['requests'])
+                self.stdout.write(f'{label:20} {prefix:10} {found:8} '
+                                  f'{queries:8} {rate:10.0f}')
+        self.stdout.write(
+            'Поиск по индексу и запросы к API читают счётчик изменений '
+            'ингредиентов из кэша, с Redis это один запрос к кэшу на поиск.'
+        )
@@ -0,0 +1,156 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.models import (Ingredient, IngredientRecipe, Recipe, ShoppingList,
+                            Tag)
+from users.models import User
+
+RECIPES_URL = '/api/recipes/'
+
+BENCHMARK_USERNAME = 'benchmark_recipe_update'
+
+
+class Rollback(Exception):
+    """Отмена транзакции с данными для замеров."""
+
+
+class Command(BaseCommand):
+
+    help = ('Замер количества запросов к базе данных и времени обновления '
+            'рецепта с разным количеством ингредиентов. Рецепт, его автор '
+            'и покупатели создаются в транзакции, которая отменяется после '
+            'замеров')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=(5, 50, 200),
+                            help='Количество ингредиентов в рецепте')
+        parser.add_argument('--buyers', type=int, default=3,
+                            help='Количество пользователей, у которых '
+                                 'рецепт в списке покупок')
+        parser.add_argument('--repeat', type=int, default=10,
+                            help='Количество повторов каждого обновления')
+
+    def get_scenarios(self, ingredients, size):
+        """
+        Тройки (название, первый состав, второй состав) для замеров.
+        Составы - словари {id ингредиента: количество}, рецепт обновляется
+        попеременно то одним, то другим составом, поэтому каждое
+        обновление вносит одни и те же изменения.
+        """
+        original = {pk: 1 for pk in ingredients[:size]}
+        shift = max(size // 3, 1)
+        replaced = {pk: 2 for pk in ingredients[shift:size + shift]}
+        return (
+            ('без изменений', original, original),
+            ('изменено количество', original,
+             {pk: 2 for pk in ingredients[:size]}),
+            (f'заменено {shift}, изменено {size - shift}', original,
+             replaced),
+        )
+
+    def measure(self, client, recipe, scenario, repeat):
+        """
+        Количество запросов к базе данных и время ответов в миллисекундах
+        для repeat обновлений рецепта составами scenario.
+        """
+        url = f'{RECIPES_URL}{recipe.pk}/'
+        tag = recipe.tags.get().pk
+        timings = []
+        for index in range(repeat + 1):
+            amounts = scenario[index % 2]
+            data = {'tags': [tag],
+                    'ingredients': [{'id': pk, 'amount': amount}
+                                    for pk, amount in amounts.items()]}
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                response = client.patch(url, data, format='json')
+                duration = (time.perf_counter() - start) * 1000
+            if response.status_code != 200:
+                raise CommandError(f'PATCH {url}: {response.status_code}')
+            if index:
+                timings.append(duration)
+        return len(context.captured_queries), timings
+
+    def create_recipe(self, author, tag, amounts, buyers):
+        """
+        Рецепт с ингредиентами amounts в списках покупок buyers. Рецепты
+        добавляются в списки покупок по одному, чтобы сигналы учли
+        их ингредиенты в списках.
+        """
+        recipe = Recipe.objects.create(
+            author=author, name='Рецепт для замеров', text='Описание',
+            cooking_time=10, image='recipes/images/benchmark.png',
+            thumbnail='recipes/thumbnails/benchmark.jpg'
+        )
+        recipe.tags.add(tag)
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(recipe=recipe, ingredient_id=pk, amount=amount)
+            for pk, amount in amounts.items()
+        )
+        for buyer in buyers:
+            ShoppingList.objects.create(user=buyer, recipe=recipe)
+        return recipe
+
+    def run(self, kwargs):
+        sizes = sorted(kwargs['sizes'])
+        needed = sizes[-1] + max(sizes[-1] // 3, 1)
+        ingredients = list(
+            Ingredient.objects.order_by('pk').values_list('pk', flat=True)
+            [:needed]
+        )
+        if len(ingredients) < needed:
+            raise CommandError(f'В базе данных меньше {needed} ингредиентов')
+        tag = Tag.objects.first()
+        if tag is None:
+            raise CommandError('В базе данных нет тегов')
+        author = User.objects.create(username=BENCHMARK_USERNAME,
+                                     email='benchmark@localhost')
+        buyers = User.objects.bulk_create(
+            User(username=f'{BENCHMARK_USERNAME}_{index}',
+                 email=f'benchmark_{index}@localhost')
+            for index in range(kwargs['buyers'])
+        )
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS
+                     if host != '*'), 'localhost')
+        client = APIClient(HTTP_HOST=host)
+        client.force_authenticate(author)
+        header = (f'{"Ингредиентов":>12} {"Изменение":30} {"Запросов":>8} '
+                  f'{"min":>8} {"median":>8} {"max":>8}')
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for size in sizes:
+            for label, *scenario in self.get_scenarios(ingredients, size):
+                recipe = self.create_recipe(author, tag, scenario[1],
+                                            buyers)
+                queries, timings = self.measure(client, recipe, scenario,
+                                                kwargs['repeat'])
+                self.stdout.write(
+                    f'{size:12} {label:30} {queries:8} {min(timings):8.1f} '
+                    f'{statistics.median(timings):8.1f} {max(timings):8.1f}'
+                )
+        self.stdout.write(
+            'Время ответа в миллисекундах. Количество запросов включает '
+            'SAVEPOINT и RELEASE SAVEPOINT транзакции обновления, '
+            'вложенной в транзакцию замеров.'
+        )
+
+    def handle(self, *args, **kwargs):
+        if User.objects.filter(
+            username__startswith=BENCHMARK_USERNAME
+        ).exists():
+            raise CommandError(
+                f'Пользователь {BENCHMARK_USERNAME} уже существует'
+            )
+        try:
+            with transaction.atomic():
+                self.run(kwargs)
+                raise Rollback
+        except Rollback:
+            pass
@@ -0,0 +1,100 @@
+import resource
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from api.renderers import SHOPPING_LIST_RENDERERS
+from api.utils import SHOP_CART_WRITERS, render_shop_cart, stream_shop_cart
+
+FORMATS = ('pdf', *SHOP_CART_WRITERS)
+
+
+def cart_rows(size):
+    """Строки shop_cart_ingredients списка покупок из size ингредиентов."""
+    return [{'ingredient__name': f'Ингредиент для проверки {index}',
+             'ingredient__measurement_unit': 'г',
+             'sum_amount': size - index}
+            for index in range(size)]
+
+
+class Command(BaseCommand):
+
+    help = ('Замер времени построения и отдачи списка покупок, времени '
+            'до первой части ответа и пиковой памяти процесса при разном '
+            'количестве ингредиентов. Строки списка генерируются без '
+            'обращения к базе данных')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=(10, 1000, 10000),
+                            help='Количество ингредиентов в списке покупок')
+        parser.add_argument('--formats', nargs='+', choices=FORMATS,
+                            default=FORMATS, help='Форматы файла')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Количество повторов для замера времени')
+
+    def download(self, file_format, rows):
+        """
+        Ответ со списком покупок в формате file_format, прочитанный
+        целиком, как при отдаче клиенту. Возвращает размер файла и время
+        до получения первой части ответа в миллисекундах.
+        """
+        start = time.perf_counter()
+        if file_format == 'pdf':
+            response = render_shop_cart(iter(rows))
+        else:
+            renderer = self.renderers[file_format]
+            response = stream_shop_cart(
+                (tuple(row.values()) for row in rows), renderer
+            )
+        chunks = iter(response)
+        size = len(next(chunks, b''))
+        first_chunk = (time.perf_counter() - start) * 1000
+        size += sum(len(chunk) for chunk in chunks)
+        response.close()
+        return size, first_chunk
+
+    def handle(self, *args, **kwargs):
+        self.renderers = {renderer.format: renderer() for renderer
+                          in SHOPPING_LIST_RENDERERS}
+        header = (f'{"Формат":6} {"Строк":>7} {"Размер, КБ":>10} '
+                  f'{"median, мс":>10} {"max, мс":>8} '
+                  f'{"Первая часть, мс":>16} '
+                  f'{"Пик Python, КБ":>14} {"Пик RSS, МБ":>11}')
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for size in sorted(kwargs['sizes']):
+            rows = cart_rows(size)
+            for file_format in kwargs['formats']:
+                timings = []
+                first_chunks = []
+                for _ in range(kwargs['repeat']):
+                    start = time.perf_counter()
+                    file_size, first_chunk = self.download(file_format,
+                                                           rows)
+                    timings.append((time.perf_counter() - start) * 1000)
+                    first_chunks.append(first_chunk)
+                tracemalloc.start()
+                self.download(file_format, rows)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                self.stdout.write(
+                    f'{file_format:6} {size:7} {file_size / 1024:10.1f} '
+                    f'{statistics.median(timings):10.1f} '
+                    f'{max(timings):8.1f} '
+                    f'{statistics.median(first_chunks):16.1f} '
+                    f'{peak / 1024:14.1f} '
+                    f'{max_rss / 1024:11.1f}'
+                )
+        self.stdout.write(
+            'Первая часть - медиана времени до первой части ответа: '
+            'текстовые форматы отдаются потоком, и клиент начинает '
+            'получать файл до его построения, PDF-файл строится целиком. '
+            'Пик Python - наибольший объём памяти, выделенной во время '
+            'построения и отдачи файла (tracemalloc). Пик RSS - наибольший '
+            'размер процесса с момента запуска (getrusage), размеры '
+            'списков проверяются по возрастанию.'
+        )
@@ -0,0 +1,141 @@
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+SEQ_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'^SCAN (?:TABLE )?(\w+)$'),
+}
+
+EXPLAIN_PREFIXES = {
+    'postgresql': 'EXPLAIN ANALYZE ',
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+}
+
+
+class Command(BaseCommand):
+
+    help = ('Выполнение EXPLAIN ANALYZE для запросов основных эндпоинтов '
+            'и вывод таблиц, которые читаются последовательным сканированием')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='username пользователя, от имени которого выполняются '
+                 'запросы. По умолчанию - пользователь с наибольшим '
+                 'количеством подписок'
+        )
+        parser.add_argument('--tags', type=int, default=2,
+                            help='Количество тегов в запросе с фильтром '
+                                 'по тегам')
+
+    def get_user(self, username):
+        """Пользователь, от имени которого выполняются запросы."""
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь {username} не найден')
+        user = User.objects.annotate(
+            followings_count=Count('follower')
+        ).order_by('-followings_count', 'pk').first()
+        if user is None:
+            raise CommandError('В базе данных нет пользователей')
+        return user
+
+    def get_endpoints(self, tags_count):
+        """Адреса эндпоинтов с параметрами из данных в базе."""
+        recipe = Recipe.objects.first()
+        if recipe is None:
+            raise CommandError('В базе данных нет рецептов')
+        slugs = Tag.objects.values_list('slug', flat=True)[:tags_count]
+        tags = '&'.join(f'tags={slug}' for slug in slugs)
+        return (
+            '/api/recipes/?limit=6',
+            f'/api/recipes/?author={recipe.author_id}&limit=6',
+            f'/api/recipes/?{tags}&limit=6',
+            '/api/recipes/?is_favorited=1&limit=6',
+            '/api/recipes/?is_in_shopping_cart=1&limit=6',
+            f'/api/recipes/?search={recipe.name.split()[0]}&limit=6',
+            f'/api/recipes/{recipe.pk}/',
+            '/api/users/subscriptions/?recipes_limit=3',
+            '/api/recipes/download_shopping_cart/',
+        )
+
+    def explain(self, sql):
+        """План запроса sql и таблицы с последовательным сканированием."""
+        with connection.cursor() as cursor:
+            cursor.execute(EXPLAIN_PREFIXES[connection.vendor] + sql)
+            plan = [str(row[-1]) for row in cursor.fetchall()]
+        pattern = SEQ_SCAN_PATTERNS[connection.vendor]
+        seq_scans = {match.group(1) for line in plan
+                     for match in [pattern.search(line.strip())] if match}
+        return plan, seq_scans & self.tables
+
+    def explain_queries(self, label, queries):
+        """Вывод планов запросов эндпоинта label."""
+        selects = [query['sql'] for query in queries
+                   if query['sql'].lstrip().upper().startswith('SELECT')]
+        seq_scans = set()
+        for sql in selects:
+            plan, query_seq_scans = self.explain(sql)
+            seq_scans |= query_seq_scans
+            if self.verbosity > 1:
+                self.stdout.write(sql)
+                self.stdout.write('\n'.join(f'    {line}' for line in plan))
+        message = f'{label}: запросов {len(selects)}'
+        if seq_scans:
+            self.stdout.write(self.style.WARNING(
+                f'{message}, последовательное сканирование: '
+                f'{", ".join(sorted(seq_scans))}'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
+        return bool(seq_scans)
+
+    def handle(self, *args, **kwargs):
+        if connection.vendor not in EXPLAIN_PREFIXES:
+            raise CommandError(
+                f'СУБД {connection.vendor} не поддерживается'
+            )
+        self.verbosity = kwargs['verbosity']
+        self.tables = set(connection.introspection.table_names())
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS
+                     if host != '*'), 'localhost')
+        client = APIClient(HTTP_HOST=host)
+        client.force_authenticate(self.get_user(kwargs['user']))
+        with_seq_scans = 0
+        for url in self.get_endpoints(kwargs['tags']):
+            with CaptureQueriesContext(connection) as context:
+                response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f'GET {url}: {response.status_code}')
+            with_seq_scans += self.explain_queries(
+                f'GET {url}', context.captured_queries
+            )
+        name = Ingredient.objects.values_list('name', flat=True).first()
+        if name:
+            with CaptureQueriesContext(connection) as context:
+                list(Ingredient.objects.search(name[:3])[:10])
+            with_seq_scans += self.explain_queries(
+                f'Поиск ингредиентов по "{name[:3]}" в базе данных',
+                context.captured_queries
+            )
+        if with_seq_scans:
+            self.stdout.write(self.style.WARNING(
+                f'Последовательное сканирование в {with_seq_scans} '
+                f'эндпоинтах. На маленьких таблицах это ожидаемо, '
+                f'планы стоит проверять на заполненной базе данных.'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                'Последовательного сканирования нет'
+            ))
@@ -0,0 +1,101 @@
+import bisect
+import threading
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+def format_labels(labels):
+    """Метки в формате Prometheus: {name="value",...}."""
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+
+
+class Counter:
+    """Счётчик с метками, хранящийся в памяти процесса."""
+    type = 'counter'
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, labels, amount=1):
+        labels = tuple(labels.items())
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        for labels, value in sorted(values.items()):
+            yield self.name, labels, value
+
+
+class Histogram(Counter):
+    """Гистограмма с метками, хранящаяся в памяти процесса."""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = buckets
+
+    def observe(self, labels, value):
+        labels = tuple(labels.items())
+        with self.lock:
+            counts, total = self.values.get(
+                labels, ([0] * (len(self.buckets) + 1), 0)
+            )
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.values[labels] = counts, total + value
+
+    def samples(self):
+        with self.lock:
+            values = {labels: (list(counts), total)
+                      for labels, (counts, total) in self.values.items()}
+        for labels, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield (f'{self.name}_bucket', labels + (('le', bound),),
+                       cumulative)
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, cumulative
+
+
+REQUEST_DURATION = Histogram('api_request_duration_seconds',
+                             'Полное время обработки запроса')
+REQUEST_VIEW = Histogram('api_request_view_seconds',
+                         'Время выполнения view, включая запросы к базе '
+                         'данных и сериализацию объектов')
+REQUEST_DB = Histogram('api_request_db_seconds',
+                       'Время выполнения SQL-запросов')
+REQUEST_RENDER = Histogram('api_request_render_seconds',
+                           'Время преобразования ответа в JSON')
+REQUEST_QUERIES = Histogram('api_request_queries',
+                            'Количество SQL-запросов', QUERY_BUCKETS)
+RESPONSES = Counter('api_responses_total', 'Количество ответов')
+
+METRICS = (REQUEST_DURATION, REQUEST_VIEW, REQUEST_DB, REQUEST_RENDER,
+           REQUEST_QUERIES, RESPONSES)
+
+
+def render_metrics():
+    """
+    Все метрики в текстовом формате Prometheus. Метрики хранятся
+    отдельно в каждом процессе сервера.
+    """
+    lines = []
+    for metric in METRICS:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        lines.extend(f'{name}{format_labels(labels)} {value}'
+                     for name, labels, value in metric.samples())
+    return '\n'.join(lines) + '\n'
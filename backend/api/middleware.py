@@ -0,0 +1,151 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.db import connections
+
+from .metrics import (REQUEST_DB, REQUEST_DURATION, REQUEST_QUERIES,
+                      REQUEST_RENDER, REQUEST_VIEW, RESPONSES)
+
+logger = logging.getLogger(__name__)
+
+
+def get_view_name(view_func, method):
+    """
+    Имя view для меток метрик: для вьюсетов - класс и действие,
+    например RecipeViewSet.list, для остальных view - путь к функции.
+    """
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{view_class.__name__}.{actions.get(method, method)}'
+
+
+class RequestMetrics:
+    """Запросы к базе данных и отметки времени одного HTTP-запроса."""
+
+    def __init__(self):
+        self.view = 'unresolved'
+        self.queries = []
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.view_finished = None
+
+    def execute(self, execute, sql, params, many, context):
+        """Обёртка выполнения SQL, замеряющая время каждого запроса."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+
+class RequestMetricsMiddleware:
+    """
+    Сбор количества SQL-запросов, времени работы базы данных, view,
+    преобразования ответа в JSON и полного времени ответа по каждому
+    view. Значения добавляются в гистограммы из metrics, при
+    REQUEST_METRICS_HEADERS они также передаются в заголовках ответа.
+    Запросы дольше SLOW_REQUEST_SECONDS или с количеством SQL-запросов
+    больше SLOW_REQUEST_QUERIES записываются в лог, см. log_slow_request.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = request.metrics = RequestMetrics()
+        with self.wrap_connections(metrics):
+            response = self.get_response(request)
+        self.record(request, response, metrics, time.perf_counter())
+        return response
+
+    async def __acall__(self, request):
+        metrics = request.metrics = RequestMetrics()
+        stack = await sync_to_async(self.wrap_connections)(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self.record(request, response, metrics, time.perf_counter())
+        return response
+
+    def wrap_connections(self, metrics):
+        """
+        Замер запросов к базе данных через соединения текущего потока.
+        Соединения у каждого потока свои, а ORM при ASGI выполняет запросы
+        в потоке sync_to_async, общем для всех вызовов одного HTTP-запроса,
+        поэтому при ASGI обёртка ставится в этом потоке.
+        """
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(metrics.execute))
+        return stack
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics.view = get_view_name(view_func,
+                                             request.method.lower())
+        request.metrics.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        request.metrics.view_finished = time.perf_counter()
+        return response
+
+    def record(self, request, response, metrics, finished):
+        """Сохранение метрик запроса, заголовки и лог медленных запросов."""
+        total = finished - metrics.started
+        db_time = sum(duration for _, duration in metrics.queries)
+        view_time = render_time = 0
+        if metrics.view_started is not None:
+            view_finished = metrics.view_finished or finished
+            view_time = view_finished - metrics.view_started
+            render_time = finished - view_finished
+        labels = {'view': metrics.view}
+        REQUEST_DURATION.observe(labels, total)
+        REQUEST_VIEW.observe(labels, view_time)
+        REQUEST_DB.observe(labels, db_time)
+        REQUEST_RENDER.observe(labels, render_time)
+        REQUEST_QUERIES.observe(labels, len(metrics.queries))
+        RESPONSES.inc({'view': metrics.view,
+                       'status': response.status_code})
+        if settings.REQUEST_METRICS_HEADERS:
+            response['X-DB-Queries'] = len(metrics.queries)
+            response['Server-Timing'] = ', '.join(
+                f'{name};dur={duration * 1000:.1f}'
+                for name, duration in (('db', db_time), ('view', view_time),
+                                       ('render', render_time),
+                                       ('total', total))
+            )
+        if (total > settings.SLOW_REQUEST_SECONDS
+                or len(metrics.queries) > settings.SLOW_REQUEST_QUERIES):
+            self.log_slow_request(request, metrics, total, db_time)
+
+    def log_slow_request(self, request, metrics, total, db_time):
+        """
+        Время и количество SQL-запросов медленного запроса с уровнем
+        WARNING, текст SQL-запросов - с уровнем DEBUG.
+        """
+        logger.warning(
+            'Медленный запрос %s %s (%s): %.1f мс, SQL-запросов %s '
+            'за %.1f мс',
+            request.method, request.get_full_path(), metrics.view,
+            total * 1000, len(metrics.queries), db_time * 1000
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                'SQL-запросы медленного запроса %s %s:\n%s',
+                request.method, request.get_full_path(),
+                '\n'.join(f'{duration * 1000:.1f} мс: {sql}'
+                          for sql, duration in metrics.queries)
+            )
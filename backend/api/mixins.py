@@ -0,0 +1,124 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, urlencode
+from rest_framework import status
+from rest_framework.response import Response
+
+from recipes.cache import get_generation
+
+
+class ConditionalGetMixin:
+    """
+    Поддержка условных GET-запросов для справочных данных.
+    ETag строится по счётчику изменений данных cache_generation; при
+    совпадении с If-None-Match возвращается 304 без обращения к базе данных
+    и сериализации. Cache-Control позволяет кэшировать ответ в nginx.
+    """
+    cache_generation = None
+    cache_max_age = 60 * 5
+
+    @classmethod
+    def get_etag(cls):
+        """ETag для текущего состояния данных."""
+        return (f'"{cls.cache_generation}-'
+                f'{get_generation(cls.cache_generation)}"')
+
+    @classmethod
+    def is_not_modified(cls, request, etag):
+        """Совпадение etag с заголовком If-None-Match запроса."""
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        return etag in if_none_match or '*' in if_none_match
+
+    @classmethod
+    def patch_conditional_headers(cls, response, etag):
+        """Заголовки ETag и Cache-Control для ответа 200 или 304."""
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=cls.cache_max_age)
+        return response
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        """Ответ 304 при неизменившихся данных, иначе ответ handler."""
+        etag = self.get_etag()
+        if self.is_not_modified(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        return self.patch_conditional_headers(response, etag)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request,
+                                         *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request,
+                                         *args, **kwargs)
+
+
+class AnonymousCacheMixin:
+    """
+    Кэширование ответов list для анонимных пользователей.
+    Ключ строится по адресу запроса с отсортированными параметрами
+    и по счётчику изменений данных cache_generation, поэтому после изменения
+    данных старые записи больше не используются. Одновременные запросы
+    с одинаковым ключом ждут, пока ответ вычислит первый из них.
+    """
+    cache_generation = None
+    cache_timeout = settings.RESPONSE_CACHE_TIMEOUT
+    cache_lock_timeout = 10
+    cache_wait_interval = 0.05
+
+    def get_cache_key(self, request):
+        """Ключ кэша для нормализованного адреса запроса."""
+        query = urlencode(sorted(
+            (key, value)
+            for key, values in request.query_params.lists()
+            for value in values
+        ))
+        url = f'{request.build_absolute_uri(request.path)}?{query}'
+        return 'response:{}:{}:{}'.format(
+            self.cache_generation,
+            get_generation(self.cache_generation),
+            hashlib.md5(url.encode()).hexdigest()
+        )
+
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        lock_key = f'{key}:lock'
+        if not cache.add(lock_key, True, self.cache_lock_timeout):
+            data = self.wait_for_cache(key, lock_key)
+            if data is not None:
+                return Response(data)
+        try:
+            response = super().list(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(key, response.data, self.cache_timeout)
+            return response
+        finally:
+            cache.delete(lock_key)
+
+    def wait_for_cache(self, key, lock_key):
+        """
+        Ожидание ответа, который вычисляет другой запрос. Возвращает None,
+        если ответ не появился в кэше за cache_lock_timeout секунд или
+        вычислявший его запрос завершился ошибкой.
+        """
+        deadline = time.monotonic() + self.cache_lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.cache_wait_interval)
+            data = cache.get(key)
+            if data is not None:
+                return data
+            if not cache.get(lock_key):
+                return None
+        return None
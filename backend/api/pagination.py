@@ -1,7 +1,301 @@
+import base64
+import binascii
+import hashlib
+import json
+from datetime import datetime
+
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class FoodgramCursorPagination(pagination.BasePagination):
+    """
+    Пагинация по курсору без подсчёта количества объектов и без OFFSET.
+    Курсор хранит значения полей сортировки последнего объекта страницы,
+    следующая страница выбирается условием по этим полям, поэтому
+    время запроса не зависит от того, насколько далеко листается лента.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = 6
+    invalid_cursor_message = 'Неверный курсор'
+
+    def get_page_size(self, request):
+        """Размер страницы из параметра limit."""
+        try:
+            return pagination._positive_int(
+                request.query_params[self.page_size_query_param], strict=True
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_ordering(self, queryset):
+        """
+        Поля сортировки запроса с уникальным полем pk в конце, чтобы
+        значения курсора однозначно определяли позицию.
+        """
+        ordering = list(queryset.query.order_by
+                        or queryset.model._meta.ordering)
+        if not {'pk', '-pk', 'id', '-id'} & set(ordering):
+            descending = bool(ordering) and ordering[0].startswith('-')
+            ordering.append('-pk' if descending else 'pk')
+        return ordering
+
+    def decode_cursor(self, request):
+        """Значения полей сортировки и направление из параметра cursor."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            return list(cursor['v']), bool(cursor['r'])
+        except (binascii.Error, ValueError, KeyError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_field(self, queryset, name):
+        """Поле модели или аннотации запроса, по которому идёт сортировка."""
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        if name == 'pk':
+            return queryset.model._meta.pk
+        return queryset.model._meta.get_field(name)
+
+    def convert_values(self, queryset, values):
+        """
+        Значения курсора, приведённые к типам полей сортировки и проверенные
+        их валидаторами. Курсор приходит от клиента, поэтому неверные
+        значения дают 404, а не ошибку базы данных.
+        """
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            return [
+                self.get_field(queryset, field.lstrip('-')).clean(value, None)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (FieldDoesNotExist, ValidationError, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def make_cursor(self, values, reverse):
+        """Значение параметра cursor для позиции values."""
+        values = [value.isoformat() if isinstance(value, datetime) else value
+                  for value in values]
+        cursor = json.dumps({'v': values, 'r': reverse})
+        return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+    def encode_cursor(self, values, reverse):
+        """Ссылка на страницу после или перед объектом с values."""
+        url = remove_query_param(self.request.build_absolute_uri(), 'page')
+        return replace_query_param(url, self.cursor_query_param,
+                                   self.make_cursor(values, reverse))
+
+    def get_position_filter(self, values, reverse):
+        """
+        Условие для объектов, идущих после позиции values при сортировке
+        ordering, или перед ней при reverse. Нестрогое условие по первому
+        полю сортировки дублирует условие позиции, но, в отличие от OR,
+        используется как условие поиска по индексу сортировки, и глубокие
+        страницы не просматривают индекс с начала.
+        """
+        first = self.ordering[0]
+        lookup = 'lte' if first.startswith('-') != reverse else 'gte'
+        bound = Q(**{f'{first.lstrip("-")}__{lookup}': values[0]})
+        position = Q()
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            condition = Q(**{f'{name}__{lookup}': values[index]})
+            for previous, value in zip(self.ordering[:index], values):
+                condition &= Q(**{previous.lstrip('-'): value})
+            position |= condition
+        return bound & position
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(queryset)
+        page_size = self.get_page_size(request)
+        values, reverse = self.decode_cursor(request)
+        if values is not None:
+            values = self.convert_values(queryset, values)
+            queryset = queryset.filter(
+                self.get_position_filter(values, reverse)
+            )
+        ordering = self.ordering
+        if reverse:
+            ordering = [field[1:] if field.startswith('-') else f'-{field}'
+                        for field in ordering]
+        page = list(queryset.order_by(*ordering)[:page_size + 1])
+        has_more = len(page) > page_size
+        page = page[:page_size]
+        if reverse:
+            page.reverse()
+        self.has_next = has_more or reverse
+        self.has_previous = has_more if reverse else values is not None
+        self.page = page
+        return page
+
+    def get_values(self, obj):
+        """Значения полей сортировки объекта."""
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_values(self.page[-1]), False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.get_values(self.page[0]), True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
 
 
 class FoodgramPagination(pagination.PageNumberPagination):
-    """Кастомная пагинация."""
+    """
+    Кастомная пагинация. При наличии параметра cursor, в том числе пустого,
+    используется пагинация по курсору FoodgramCursorPagination.
+    """
     page_size_query_param = 'limit'
     page_size = 6
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.cursor_query_param in request.query_params:
+            self.cursor_paginator = FoodgramCursorPagination()
+            return self.cursor_paginator.paginate_queryset(queryset, request,
+                                                           view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class EstimatedCountPage(Page):
+    """
+    Страница EstimatedCountPaginator. Наличие следующей страницы
+    определяется по лишнему объекту, выбранному вместе со страницей,
+    а не по приблизительному количеству страниц.
+    """
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator с приблизительным подсчётом количества объектов.
+    Для запроса без условий по таблице PostgreSQL количество берётся
+    из статистики планировщика (pg_class.reltuples), для остальных
+    запросов большое количество сохраняется в кэше на count_cache_timeout
+    секунд. Если объектов не больше exact_count_threshold, всегда
+    выполняется точный подсчёт.
+    Приблизительное количество только отдаётся в ответе: существование
+    страницы и наличие следующей определяются выборкой per_page + 1
+    объектов, поэтому при заниженной оценке последние страницы доступны,
+    а при завышенной у последней страницы нет ссылки next.
+    """
+    exact_count_threshold = 1000
+    count_cache_timeout = 30
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_is_exact = True
+
+    def get_table_estimate(self, queryset):
+        """Оценка количества строк таблицы из статистики PostgreSQL."""
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                (queryset.model._meta.db_table,)
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def validate_number(self, number):
+        """
+        Проверка номера страницы без сравнения с приблизительным
+        количеством страниц: пустые страницы отсекает page().
+        """
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            number = int(number)
+            if number < 1:
+                raise
+            return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        objects = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not objects and (number > 1 or not self.allow_empty_first_page):
+            raise EmptyPage('That page contains no results')
+        return EstimatedCountPage(objects[:self.per_page], number, self,
+                                  len(objects) > self.per_page)
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = self.get_table_estimate(queryset)
+            if estimate is not None and estimate > self.exact_count_threshold:
+                self.count_is_exact = False
+                return estimate
+        key = 'count:{}:{}'.format(
+            queryset.db, hashlib.md5(str(queryset.query).encode()).hexdigest()
+        )
+        count = cache.get(key)
+        if count is not None:
+            self.count_is_exact = False
+            return count
+        count = queryset.count()
+        if count > self.exact_count_threshold:
+            cache.set(key, count, self.count_cache_timeout)
+        return count
+
+
+class FoodgramEstimatedCountPagination(FoodgramPagination):
+    """
+    Пагинация по номеру страницы с приблизительным количеством объектов.
+    Поле count_is_exact в ответе показывает, точное ли значение count.
+    """
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return super().get_paginated_response(data)
+        return Response({
+            'count': self.page.paginator.count,
+            'count_is_exact': self.page.paginator.count_is_exact,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
@@ -0,0 +1,57 @@
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """
+    Формат файла списка покупок для выбора по заголовку Accept или
+    параметру format. Сам файл строит view, а render выводит в JSON
+    данные остальных ответов: ошибок и задач построения PDF.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = JSONRenderer.media_type
+        return JSONRenderer().render(data)
+
+
+class PDFRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+
+class PlainTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+SHOPPING_LIST_RENDERERS = (PDFRenderer, PlainTextRenderer, CSVRenderer,
+                           JSONRenderer)
+
+
+class ShoppingListNegotiation(DefaultContentNegotiation):
+    """
+    Выбор формата списка покупок. Для неизвестного формата в параметре
+    format возвращается ошибка 406 со списком доступных форматов, как
+    для неподходящего заголовка Accept, а не 404.
+    """
+
+    def filter_renderers(self, renderers, format):
+        filtered = [renderer for renderer in renderers
+                    if renderer.format == format]
+        if not filtered:
+            formats = ', '.join(renderer.format for renderer in renderers)
+            raise NotAcceptable(
+                f'Формат {format} не поддерживается. '
+                f'Доступные форматы: {formats}',
+                available_renderers=renderers
+            )
+        return filtered
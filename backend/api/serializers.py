@@ -1,13 +1,19 @@
 import base64
+import binascii
+import io
+import re
 
 from django.conf import settings
-from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import (InMemoryUploadedFile,
+                                            TemporaryUploadedFile)
 from django.db import transaction
 from djoser import serializers as djoser_serializers
-from rest_framework import serializers
+from rest_framework import pagination, serializers
 
+from recipes.images import delete_thumbnails
 from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                            ShoppingList, Tag)
+                            ShoppingCartIngredient, ShoppingList, Tag,
+                            TagRecipe)
 from users.models import Follow, User
 
 
@@ -30,6 +36,8 @@ class UserReadSerializer(djoser_serializers.UserSerializer):
         user = self.context['request'].user
         if not user.is_authenticated or user == obj:
             return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return Follow.objects.filter(user=user, following=obj).exists()
 
 
@@ -93,25 +101,88 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
 
 
 class Base64ImageField(serializers.ImageField):
-    """Сериализатор для декодирования текста в картинку."""
+    """
+    Сериализатор для декодирования текста в картинку. Тип и размер
+    изображения проверяются до декодирования, затем текст декодируется
+    частями по chunk_size символов в файл в памяти, а если изображение
+    больше FILE_UPLOAD_MAX_MEMORY_SIZE - во временный файл на диске.
+    Переводы строк и пробелы в данных base64 пропускаются, остальные
+    символы не из алфавита base64 дают ошибку.
+    """
+    chunk_size = 64 * 1024
+    whitespace = ' \t\r\n\f\v'
+    image_types = {
+        'image/jpeg': ('jpg', re.compile(rb'\xff\xd8\xff')),
+        'image/jpg': ('jpg', re.compile(rb'\xff\xd8\xff')),
+        'image/png': ('png', re.compile(rb'\x89PNG\r\n\x1a\n')),
+        'image/gif': ('gif', re.compile(rb'GIF8[79]a')),
+        'image/webp': ('webp', re.compile(rb'RIFF.{4}WEBP', re.DOTALL)),
+    }
+    default_error_messages = {
+        'invalid_base64': 'Изображение должно быть в формате '
+                          'data:image/<тип>;base64,<данные>',
+        'invalid_type': 'Поддерживаются изображения JPEG, PNG, GIF и WebP',
+        'too_large': 'Размер изображения больше {max_size} байт',
+    }
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = self.decode(data)
         return super().to_internal_value(data)
 
+    def decode(self, data):
+        """Декодирование изображения в формате data URI в файл."""
+        separator = data.find(';base64,', 0, 100)
+        if separator == -1:
+            self.fail('invalid_base64')
+        content_type = data[len('data:'):separator].lower()
+        if content_type not in self.image_types:
+            self.fail('invalid_type')
+        extension, signature = self.image_types[content_type]
+        start = separator + len(';base64,')
+        if any(char in data for char in self.whitespace):
+            data = data[:start] + ''.join(data[start:].split())
+        size = (len(data) - start) // 4 * 3 - data.count('=', -2)
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+        if size > max_size:
+            self.fail('too_large', max_size=max_size)
+        name = f'temp.{extension}'
+        if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            file = TemporaryUploadedFile(name, content_type, size, None)
+        else:
+            file = InMemoryUploadedFile(io.BytesIO(), None, name,
+                                        content_type, size, None)
+        try:
+            for position in range(start, len(data), self.chunk_size):
+                chunk = base64.b64decode(
+                    data[position:position + self.chunk_size], validate=True
+                )
+                if position == start and not signature.match(chunk):
+                    self.fail('invalid_type')
+                file.write(chunk)
+        except binascii.Error:
+            file.close()
+            self.fail('invalid_base64')
+        except serializers.ValidationError:
+            file.close()
+            raise
+        file.seek(0)
+        return file
+
 
 class RecipeReadMinSerializer(serializers.ModelSerializer):
     """Сериализатор для просмотра краткой информации о рецептах."""
     name = serializers.CharField(read_only=True)
     image = Base64ImageField(read_only=True)
+    thumbnail = serializers.ImageField(read_only=True)
+    thumbnail_webp = serializers.ImageField(read_only=True)
     cooking_time = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Recipe
         fields = (
-            'id', 'name', 'image', 'cooking_time'
+            'id', 'name', 'image', 'thumbnail', 'thumbnail_webp',
+            'cooking_time'
         )
 
 
@@ -129,17 +200,22 @@ class RecipeReadMaxSerializer(RecipeReadMinSerializer,
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time'
+            'is_in_shopping_cart', 'name', 'image', 'thumbnail',
+            'thumbnail_webp', 'text', 'cooking_time'
         )
 
     def get_is_favorited(self, obj):
         """Проверка, есть ли рецепт в избранном пользователя."""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         return (user.is_authenticated
                 and Favorite.objects.filter(user=user, recipe=obj).exists())
 
     def get_is_in_shopping_cart(self, obj):
         """Проверка, есть ли рецепт в списке покупок пользователя."""
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         return (user.is_authenticated
                 and ShoppingList.objects.filter(user=user,
@@ -186,14 +262,17 @@ class RecipeСreateUpdateDeleteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Нужно добавить хотя бы 1 ингредиент!'
             )
-        valid_ingredients = []
+        ingredients = Ingredient.objects.in_bulk(
+            [item['id'] for item in value]
+        )
+        valid_ingredients = {}
         for item in value:
-            if not Ingredient.objects.filter(pk=item['id']):
+            ingredient = ingredients.get(item['id'])
+            if ingredient is None:
                 raise serializers.ValidationError(
                     f'Ингредиента с id = {item["id"]} не существует!'
                 )
-            ingredient = Ingredient.objects.get(pk=item['id'])
-            if ingredient in valid_ingredients:
+            if ingredient.pk in valid_ingredients:
                 raise serializers.ValidationError(
                     f'Ингредиент {ingredient.name} с id = {ingredient.pk} уже '
                     'добавлен. Ингредиенты не должны повторяться!'
@@ -212,21 +291,22 @@ class RecipeСreateUpdateDeleteSerializer(serializers.ModelSerializer):
                     'Добавьте количество не больше 32000 '
                     f'{ingredient.measurement_unit}!'
                 )
-            valid_ingredients.append(ingredient)
-        return value
+            valid_ingredients[ingredient.pk] = {'ingredient': ingredient,
+                                                'amount': item['amount']}
+        return list(valid_ingredients.values())
 
     def validate_tags(self, value):
         """Валидация тегов."""
         if not value:
             raise serializers.ValidationError('Нужно добавить хотя бы 1 тег!')
-        valid_tags = []
+        valid_tags = set()
         for tag in value:
             if tag in valid_tags:
                 raise serializers.ValidationError(
                     f'Тег {tag.name} с id = {tag.pk} уже '
                     'добавлен. Теги не должны повторяться!'
                 )
-            valid_tags.append(tag)
+            valid_tags.add(tag)
         return value
 
     def validate_cooking_time(self, value):
@@ -250,36 +330,63 @@ class RecipeСreateUpdateDeleteSerializer(serializers.ModelSerializer):
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(author=self.context['request'].user,
                                        **validated_data)
-        for tag in tags:
-            recipe.tags.add(tag)
-        for ingredient in ingredients:
-            recipe.ingredients.add(
-                ingredient['id'],
-                through_defaults={
-                    'amount': ingredient['amount']}
-            )
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=recipe, tag=tag) for tag in tags
+        )
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(recipe=recipe, ingredient=item['ingredient'],
+                             amount=item['amount'])
+            for item in ingredients
+        )
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        """Обновление рецепта."""
+        """
+        Обновление рецепта. Ингредиенты обновляются по разнице между
+        старым и новым составом: удаляются убранные, добавляются новые,
+        у остальных меняется только изменившееся количество. Все изменения
+        учитываются в списках покупок одним update_recipe: удаление
+        помечено cart_updated, чтобы сигнал post_delete не пересчитывал
+        списки для каждой удалённой строки.
+        """
         instance.name = validated_data.get('name', instance.name)
-        instance.image = validated_data.get('image', instance.image)
+        if 'image' in validated_data:
+            delete_thumbnails(instance)
+            instance.image = validated_data['image']
+            instance.thumbnail = instance.thumbnail_webp = ''
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get('cooking_time',
                                                    instance.cooking_time)
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        instance.tags.clear()
-        for tag in tags:
-            instance.tags.add(tag)
-        instance.ingredients.clear()
-        for ingredient in ingredients:
-            instance.ingredients.add(
-                ingredient['id'],
-                through_defaults={
-                    'amount': ingredient['amount']}
-            )
+        instance.tags.set(tags)
+        old_ingredients = {
+            item.ingredient_id: item
+            for item in IngredientRecipe.objects.filter(recipe=instance)
+        }
+        new_amounts = {
+            item['ingredient'].pk: item['amount'] for item in ingredients
+        }
+        old_amounts = {pk: item.amount for pk, item in old_ingredients.items()}
+        removed = IngredientRecipe.objects.filter(recipe=instance).exclude(
+            ingredient_id__in=new_amounts
+        )
+        removed.cart_updated = True
+        removed.delete()
+        changed_ingredients = []
+        for pk, item in old_ingredients.items():
+            if pk in new_amounts and item.amount != new_amounts[pk]:
+                item.amount = new_amounts[pk]
+                changed_ingredients.append(item)
+        IngredientRecipe.objects.bulk_update(changed_ingredients, ('amount',))
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(recipe=instance, ingredient_id=pk, amount=amount)
+            for pk, amount in new_amounts.items()
+            if pk not in old_ingredients
+        )
+        ShoppingCartIngredient.objects.update_recipe(instance, old_amounts,
+                                                     new_amounts)
         instance.save()
         return instance
 
@@ -288,9 +395,28 @@ class RecipeСreateUpdateDeleteSerializer(serializers.ModelSerializer):
         Передача в Response подробных данных созданного или обновлённого
         рецепта через RecipeReadMaxSerializer.
         """
+        instance = Recipe.objects.for_feed(
+            self.context['request'].user
+        ).get(pk=instance.pk)
         return RecipeReadMaxSerializer(instance, context=self.context).data
 
 
+def get_recipes_limit(request):
+    """
+    Количество рецептов автора в подписках из параметра recipes_limit,
+    None - без ограничения. Неверное значение - ошибка 400.
+    """
+    recipes_limit = request.query_params.get('recipes_limit')
+    if not recipes_limit:
+        return None
+    try:
+        return pagination._positive_int(recipes_limit, strict=True)
+    except ValueError:
+        raise serializers.ValidationError({
+            'recipes_limit': 'Укажите целое положительное число.'
+        })
+
+
 class UserSubscriptionsSerializer(UserReadSerializer):
     """Сериализатор для просмотра, создания, удаления подписок."""
     recipes = serializers.SerializerMethodField()
@@ -309,15 +435,16 @@ class UserSubscriptionsSerializer(UserReadSerializer):
 
     def get_recipes(self, obj):
         """Получение рецептов избранного автора."""
-        request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
-        recipes = Recipe.objects.filter(author=obj)
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
+        recipes = getattr(obj, 'limited_recipes', None)
+        if recipes is None:
+            recipes_limit = get_recipes_limit(self.context.get('request'))
+            recipes = Recipe.objects.filter(author=obj)[:recipes_limit]
         serializer = RecipeReadMinSerializer(recipes, read_only=True,
                                              many=True)
         return serializer.data
 
     def get_recipes_count(self, obj):
         """Подсчёт количества рецептов избранного автора."""
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return Recipe.objects.filter(author=obj).count()
@@ -0,0 +1,133 @@
+import json
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.urls import reverse
+from django.utils.crypto import salted_hmac
+from rest_framework import status
+
+from .utils import shop_cart_pdf
+
+logger = logging.getLogger(__name__)
+
+JOB_KEY = 'shopping-cart-job:{}'
+
+LATEST_FILE_KEY = 'shopping-cart-file:{}'
+
+JOB_TIMEOUT = 60 * 10
+
+# Файлы хранятся вне MEDIA_ROOT, который раздаёт nginx, и отдаются
+# только их владельцу через shopping_cart_file.
+storage = FileSystemStorage(location=settings.SHOPPING_CART_FILES_ROOT)
+
+executor = None
+
+executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Пул процессов для построения PDF, создаётся при первой задаче.
+    Процессы запускаются через forkserver или spawn, а не fork: копия
+    процесса сервера с его потоками, блокировками и соединениями
+    с базой данных не наследуется, Django настраивается в процессе заново.
+    """
+    global executor
+    with executor_lock:
+        if executor is None:
+            methods = multiprocessing.get_all_start_methods()
+            method = 'forkserver' if 'forkserver' in methods else 'spawn'
+            executor = ProcessPoolExecutor(
+                max_workers=settings.SHOPPING_CART_PDF_WORKERS,
+                mp_context=multiprocessing.get_context(method),
+                initializer=django.setup
+            )
+        return executor
+
+
+def is_job_requested(request):
+    """Запрошено ли построение файла в фоне параметром async."""
+    return request.GET.get('async', '').lower() in ('1', 'true')
+
+
+def get_job_id(user, shop_ingredients):
+    """
+    Идентификатор задачи - подпись пользователя и содержимого его списка
+    покупок. Пока список не изменился, выдаётся тот же идентификатор
+    и уже построенный файл.
+    """
+    content = json.dumps(shop_ingredients, sort_keys=True)
+    return salted_hmac('shopping-cart', f'{user.pk}:{content}',
+                       algorithm='sha256').hexdigest()
+
+
+def get_file_name(user_id, job_id):
+    """Путь к PDF-файлу задачи в хранилище."""
+    return f'{user_id}/{job_id}.pdf'
+
+
+def save_file(user_id, job_id, future):
+    """
+    Сохранение построенного PDF-файла и удаление предыдущего файла
+    пользователя. Выполняется в потоке executor после завершения задачи.
+    """
+    try:
+        storage.save(get_file_name(user_id, job_id),
+                     ContentFile(future.result()))
+        previous = cache.get(LATEST_FILE_KEY.format(user_id))
+        cache.set(LATEST_FILE_KEY.format(user_id), job_id, None)
+        if previous and previous != job_id:
+            storage.delete(get_file_name(user_id, previous))
+    except Exception:
+        logger.exception('Не удалось построить список покупок '
+                         'пользователя %s', user_id)
+    finally:
+        cache.delete(JOB_KEY.format(job_id))
+
+
+def start_job(user, shop_ingredients):
+    """
+    Построение PDF-файла из строк shop_cart_ingredients в отдельном
+    процессе. Возвращает идентификатор задачи и признак готовности файла.
+    """
+    job_id = get_job_id(user, shop_ingredients)
+    if storage.exists(get_file_name(user.pk, job_id)):
+        return job_id, True
+    if cache.add(JOB_KEY.format(job_id), True, JOB_TIMEOUT):
+        future = get_executor().submit(shop_cart_pdf, shop_ingredients)
+        future.add_done_callback(partial(save_file, user.pk, job_id))
+    return job_id, False
+
+
+def get_job_file(user, job_id):
+    """
+    Открытый PDF-файл задачи пользователя, None - если файл ещё строится.
+    Если задачи нет, вызывается FileNotFoundError.
+    """
+    name = get_file_name(user.pk, job_id)
+    pending = cache.get(JOB_KEY.format(job_id))
+    if storage.exists(name):
+        return storage.open(name, 'rb')
+    if pending:
+        return None
+    raise FileNotFoundError(name)
+
+
+def job_status(request, job_id, ready):
+    """Данные и код ответа о состоянии задачи."""
+    data = {
+        'id': job_id,
+        'status': 'ready' if ready else 'pending',
+        'url': request.build_absolute_uri(
+            reverse('api:recipes-shopping-cart-file', args=(job_id,))
+        ),
+    }
+    return data, status.HTTP_200_OK if ready else status.HTTP_202_ACCEPTED
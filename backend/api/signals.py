@@ -0,0 +1,149 @@
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import forget_tokens
+from .filters import ingredient_index
+from recipes.cache import bump_generation
+from recipes.images import schedule_thumbnails
+from recipes.models import (Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCartIngredient, ShoppingList, Tag,
+                            TagRecipe, recipe_amounts)
+from users.models import User
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_ingredients_generation(**kwargs):
+    """
+    Перестроение индекса ингредиентов во всех процессах и смена ETag
+    списка ингредиентов после фиксации транзакции с их изменением.
+    """
+    transaction.on_commit(
+        lambda: bump_generation(ingredient_index.generation)
+    )
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_generation(**kwargs):
+    """Смена ETag списка тегов после их изменения."""
+    bump_generation('tags')
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=TagRecipe)
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_recipes_generation(**kwargs):
+    """
+    Сброс кэша ленты рецептов после фиксации транзакции, в которой
+    изменились рецепты или связанные с ними данные.
+    """
+    transaction.on_commit(lambda: bump_generation('recipes'))
+
+
+@receiver(post_save, sender=Recipe)
+def create_recipe_thumbnails(instance, **kwargs):
+    """Фоновое создание миниатюр для нового изображения рецепта."""
+    if instance.image and not instance.thumbnail:
+        schedule_thumbnails(instance)
+
+
+def is_direct_delete(sender, origin):
+    """
+    Удаление начато с объектов sender, а не каскадом от удаления рецепта,
+    пользователя или ингредиента. При каскадном удалении списки покупок
+    уже учтены в remove_deleted_recipe или удаляются вместе со строками.
+    У QuerySet с атрибутом cart_updated списки покупок пересчитывает
+    вызывающий код одним update_recipe, как при обновлении рецепта.
+    """
+    if getattr(origin, 'cart_updated', False):
+        return False
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model is sender
+
+
+@receiver(post_save, sender=ShoppingList)
+def add_recipe_to_cart(instance, created, **kwargs):
+    """Добавление ингредиентов рецепта в сводный список покупок."""
+    if created:
+        ShoppingCartIngredient.objects.add_recipe(instance.user_id,
+                                                  instance.recipe_id)
+
+
+@receiver(post_delete, sender=ShoppingList)
+def remove_recipe_from_cart(instance, origin, **kwargs):
+    """Удаление ингредиентов рецепта из сводного списка покупок."""
+    if is_direct_delete(ShoppingList, origin):
+        ShoppingCartIngredient.objects.remove_recipe(instance.user_id,
+                                                     instance.recipe_id)
+
+
+@receiver(pre_save, sender=IngredientRecipe)
+def remember_saved_amount(instance, **kwargs):
+    """Ингредиент и количество до изменения для учёта разницы."""
+    instance.saved_amount = None
+    if instance.pk is not None:
+        instance.saved_amount = IngredientRecipe.objects.filter(
+            pk=instance.pk
+        ).values('recipe_id', 'ingredient_id', 'amount').first()
+
+
+@receiver(post_save, sender=IngredientRecipe)
+def update_cart_amount(instance, **kwargs):
+    """
+    Учёт нового или изменённого ингредиента рецепта в списках покупок,
+    например после редактирования рецепта в админке.
+    """
+    saved = instance.__dict__.pop('saved_amount', None)
+    old_amounts = {}
+    if saved and saved['recipe_id'] == instance.recipe_id:
+        old_amounts = {saved['ingredient_id']: saved['amount']}
+    elif saved:
+        ShoppingCartIngredient.objects.update_recipe(
+            saved['recipe_id'], {saved['ingredient_id']: saved['amount']}, {}
+        )
+    ShoppingCartIngredient.objects.update_recipe(
+        instance.recipe_id, old_amounts,
+        {instance.ingredient_id: instance.amount}
+    )
+
+
+@receiver(post_delete, sender=IngredientRecipe)
+def remove_cart_amount(instance, origin, **kwargs):
+    """Учёт удалённого ингредиента рецепта в списках покупок."""
+    if is_direct_delete(IngredientRecipe, origin):
+        ShoppingCartIngredient.objects.update_recipe(
+            instance.recipe_id, {instance.ingredient_id: instance.amount}, {}
+        )
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_deleted_recipe(instance, **kwargs):
+    """
+    Удаление ингредиентов рецепта из списков покупок всех пользователей
+    одним пересчётом до каскадного удаления его строк.
+    """
+    ShoppingCartIngredient.objects.update_recipe(
+        instance, recipe_amounts(instance), {}
+    )
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(instance, **kwargs):
+    """Удаление из кэша пользователя удалённого токена, например при выходе."""
+    forget_tokens((instance.key,))
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(instance, **kwargs):
+    """
+    Удаление из кэша токенов изменённого пользователя, в том числе
+    после смены пароля или блокировки.
+    """
+    forget_tokens(Token.objects.filter(user=instance).values_list(
+        'key', flat=True
+    ))
@@ -0,0 +1,1225 @@
+import base64
+import csv
+import io
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import connection
+from django.db.models import Sum
+from django.test import (AsyncClient, AsyncRequestFactory, SimpleTestCase,
+                         TestCase, TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api import async_views, shopping_cart
+from api.authentication import CACHED_USER_FIELDS, get_token_cache_key
+from api.filters import ingredient_index
+from api.pagination import EstimatedCountPaginator
+from api.serializers import Base64ImageField
+from api.views import RecipeViewSet, TagViewSet
+from recipes import images
+from recipes.cache import bump_generation
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCartIngredient, ShoppingList, Tag,
+                            TagRecipe)
+from users.models import Follow, User
+
+RECIPES_URL = '/api/recipes/'
+
+ME_URL = '/api/users/me/'
+
+# В PostgreSQL перед подсчётом рецептов запрашивается оценка размера таблицы.
+ESTIMATE_QUERIES = int(connection.vendor == 'postgresql')
+
+IMAGE = (
+    'data:image/png;base64,'
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAQMAAAAl21bKAAAAA1BMVEUAAACnej3aAAAAAXRS'
+    'TlMAQObYZgAAAApJREFUCNdjYAAAAAIAAeIhvDMAAAAASUVORK5CYII='
+)
+
+
+def create_user(username):
+    """Пользователь с уникальными username и email."""
+    return User.objects.create(username=username,
+                               email=f'{username}@example.com',
+                               first_name=username, last_name=username)
+
+
+def create_recipe(author, tags, ingredients, name='Рецепт'):
+    """
+    Рецепт с тегами и ингредиентами: {ингредиент: количество}. Миниатюры
+    заданы заранее, чтобы не запускать их фоновое создание.
+    """
+    recipe = Recipe.objects.create(
+        author=author, name=name, text='Описание', cooking_time=10,
+        image='recipes/images/test.png',
+        thumbnail='recipes/thumbnails/test.jpg',
+        thumbnail_webp='recipes/thumbnails/test.webp'
+    )
+    TagRecipe.objects.bulk_create(
+        TagRecipe(recipe=recipe, tag=tag) for tag in tags
+    )
+    IngredientRecipe.objects.bulk_create(
+        IngredientRecipe(recipe=recipe, ingredient=ingredient, amount=amount)
+        for ingredient, amount in ingredients.items()
+    )
+    return recipe
+
+
+class APITestCase(TestCase):
+    """Общие данные: пользователи, теги, ингредиенты и рецепты."""
+    recipes_count = 12
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.authors = [create_user(f'author{index}') for index in range(3)]
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {index}', slug=f'tag{index}',
+                               color=f'#00000{index}')
+            for index in range(3)
+        ]
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {index}', measurement_unit='г')
+            for index in range(40)
+        )
+        cls.recipes = [
+            create_recipe(
+                cls.authors[index % len(cls.authors)],
+                cls.tags[:index % len(cls.tags) + 1],
+                {ingredient: index + 1
+                 for ingredient in cls.ingredients[index:index + 3]},
+                name=f'Рецепт {index}'
+            )
+            for index in range(cls.recipes_count)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user_client = APIClient()
+        self.user_client.force_authenticate(self.user)
+
+
+class IngredientIndexTest(APITestCase):
+    """Индекс ингредиентов перестраивается по общему счётчику изменений."""
+
+    def setUp(self):
+        super().setUp()
+        ingredient_index.built_generation = None
+
+    def search(self, name):
+        return [row['name'] for row in self.client.get(
+            '/api/ingredients/', {'name': name}
+        ).data]
+
+    def test_changed_in_other_process(self):
+        """
+        Изменение в другом процессе увеличивает счётчик в общем кэше,
+        и индекс этого процесса перестраивается.
+        """
+        self.assertEqual(self.search('Новый'), [])
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='Новый ингредиент', measurement_unit='г')]
+        )
+        self.assertEqual(self.search('Новый'), [])
+        bump_generation(ingredient_index.generation)
+        self.assertEqual(self.search('Новый'), ['Новый ингредиент'])
+
+    def test_changed_after_commit(self):
+        self.assertEqual(self.search('Новый'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='Новый ингредиент',
+                                      measurement_unit='г')
+        self.assertEqual(self.search('Новый'), ['Новый ингредиент'])
+
+
+class ConditionalGetTest(APITestCase):
+    """ETag, ответ 304 и Cache-Control для тегов и ингредиентов."""
+
+    def get_urls(self):
+        return ('/api/tags/', f'/api/tags/{self.tags[0].pk}/',
+                '/api/ingredients/',
+                f'/api/ingredients/{self.ingredients[0].pk}/')
+
+    def test_not_modified(self):
+        """При совпадении If-None-Match - 304 без запросов к базе данных."""
+        for url in self.get_urls():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Cache-Control'],
+                                 'public, max-age=300')
+                etag = response['ETag']
+                with self.assertNumQueries(0):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                self.assertEqual(response['Cache-Control'],
+                                 'public, max-age=300')
+
+    def assert_etag_changed(self, url, save):
+        etag = self.client.get(url)['ETag']
+        save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_tag_saved(self):
+        tag = self.tags[0]
+        tag.name = 'Новое название'
+        for url in self.get_urls()[:2]:
+            with self.subTest(url=url):
+                self.assert_etag_changed(url, tag.save)
+
+    def test_ingredient_saved(self):
+        """ETag ингредиентов меняется после фиксации транзакции."""
+        ingredient = self.ingredients[0]
+        ingredient.name = 'Новое название'
+
+        def save():
+            with self.captureOnCommitCallbacks(execute=True):
+                ingredient.save()
+
+        for url in self.get_urls()[2:]:
+            with self.subTest(url=url):
+                self.assert_etag_changed(url, save)
+
+    async def test_async_not_modified(self):
+        """Асинхронные view возвращают те же ETag и 304."""
+        factory = AsyncRequestFactory()
+        views = ((async_views.tag_list, '/api/tags/'),
+                 (async_views.ingredient_list, '/api/ingredients/'))
+        for view, url in views:
+            with self.subTest(url=url):
+                response = await view(factory.get(url))
+                self.assertEqual(response.status_code, 200)
+                etag = response['ETag']
+                response = await view(
+                    factory.get(url, **{'if-none-match': etag})
+                )
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['Cache-Control'],
+                                 'public, max-age=300')
+
+
+class AnonymousCacheTest(APITestCase):
+    """Кэширование ленты рецептов для анонимных пользователей."""
+
+    def setUp(self):
+        super().setUp()
+        self.author_client = APIClient()
+        self.author_client.force_authenticate(self.recipes[-1].author)
+
+    def get_cache_key(self, url):
+        request = Request(APIRequestFactory().get(url))
+        return RecipeViewSet().get_cache_key(request)
+
+    def test_cache_hit(self):
+        """Повторный запрос отдаётся из кэша без запросов к базе данных."""
+        response = self.client.get(RECIPES_URL)
+        with self.assertNumQueries(0):
+            cached = self.client.get(RECIPES_URL)
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(cached.data, response.data)
+
+    def test_query_params_order(self):
+        """Ключ кэша не зависит от порядка параметров запроса."""
+        self.client.get(f'{RECIPES_URL}?tags=tag0&tags=tag1&limit=2')
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                f'{RECIPES_URL}?limit=2&tags=tag1&tags=tag0'
+            )
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_authenticated_not_cached(self):
+        self.user_client.get(RECIPES_URL)
+        with CaptureQueriesContext(connection) as context:
+            response = self.user_client.get(RECIPES_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(context.captured_queries)
+        self.assertIsNone(cache.get(self.get_cache_key(RECIPES_URL)))
+
+    def assert_invalidated(self, change):
+        """После изменения change ответ из кэша больше не используется."""
+        before = self.client.get(RECIPES_URL).data
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        with CaptureQueriesContext(connection) as context:
+            after = self.client.get(RECIPES_URL).data
+        self.assertTrue(context.captured_queries)
+        self.assertNotEqual(after, before)
+
+    def test_invalidated_after_create(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+
+        def create():
+            response = self.author_client.post(RECIPES_URL, {
+                'name': 'Новый рецепт', 'text': 'Описание',
+                'cooking_time': 15, 'image': IMAGE,
+                'tags': [self.tags[0].pk],
+                'ingredients': [{'id': self.ingredients[0].pk,
+                                 'amount': 1}],
+            }, format='json')
+            self.assertEqual(response.status_code, 201)
+
+        with override_settings(MEDIA_ROOT=media_root), \
+                mock.patch.object(images, 'executor'):
+            self.assert_invalidated(create)
+
+    def test_invalidated_after_update(self):
+        recipe = self.recipes[-1]
+
+        def update():
+            response = self.author_client.patch(
+                f'{RECIPES_URL}{recipe.pk}/',
+                {'name': 'Новое название', 'tags': [self.tags[0].pk],
+                 'ingredients': [{'id': self.ingredients[0].pk,
+                                  'amount': 1}]},
+                format='json'
+            )
+            self.assertEqual(response.status_code, 200)
+
+        self.assert_invalidated(update)
+
+    def test_invalidated_after_delete(self):
+        recipe = self.recipes[-1]
+
+        def delete():
+            response = self.author_client.delete(
+                f'{RECIPES_URL}{recipe.pk}/'
+            )
+            self.assertEqual(response.status_code, 204)
+
+        self.assert_invalidated(delete)
+
+    def test_wait_for_locked_key(self):
+        """
+        Пока ответ вычисляет другой запрос, запрос ждёт его появления
+        в кэше и не выполняет запросов к базе данных.
+        """
+        key = self.get_cache_key(RECIPES_URL)
+        cache.add(f'{key}:lock', True)
+        data = {'results': []}
+        with mock.patch('api.mixins.time.sleep',
+                        side_effect=lambda _: cache.set(key, data)), \
+                self.assertNumQueries(0):
+            response = self.client.get(RECIPES_URL)
+        self.assertEqual(response.data, data)
+
+    def test_lock_released_without_response(self):
+        """Если вычислявший запрос завершился ошибкой, ответ вычисляется."""
+        key = self.get_cache_key(RECIPES_URL)
+        cache.add(f'{key}:lock', True)
+        with mock.patch('api.mixins.time.sleep',
+                        side_effect=lambda _: cache.delete(f'{key}:lock')):
+            response = self.client.get(RECIPES_URL)
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertEqual(cache.get(key), response.data)
+        self.assertIsNone(cache.get(f'{key}:lock'))
+
+    def test_lock_timeout(self):
+        """Ответ вычисляется, если блокировка не снята за отведённое время."""
+        key = self.get_cache_key(RECIPES_URL)
+        cache.add(f'{key}:lock', True)
+        with mock.patch.object(RecipeViewSet, 'cache_lock_timeout', 0.01):
+            response = self.client.get(RECIPES_URL)
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertEqual(cache.get(key), response.data)
+
+
+class RecipeFeedQueriesTest(APITestCase):
+    """Количество запросов ленты рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Follow.objects.create(user=cls.user, following=cls.authors[0])
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[0])
+        ShoppingList.objects.create(user=cls.user, recipe=cls.recipes[1])
+
+    def assert_feed_queries(self, client, queries):
+        """
+        Одинаковое количество запросов queries для первой страницы
+        из 2 и из 10 рецептов.
+        """
+        for limit in (2, 10):
+            with self.subTest(limit=limit):
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    response = client.get(RECIPES_URL, {'limit': limit})
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous_feed_queries(self):
+        """Подсчёт, рецепты с авторами, теги и ингредиенты."""
+        self.assert_feed_queries(self.client, 4 + ESTIMATE_QUERIES)
+
+    def test_authenticated_feed_queries(self):
+        """Подсчёт, рецепты с флагами, теги, ингредиенты и авторы."""
+        self.assert_feed_queries(self.user_client, 5 + ESTIMATE_QUERIES)
+
+    def test_authenticated_feed_flags(self):
+        """Флаги избранного, списка покупок и подписки из подзапросов."""
+        response = self.user_client.get(RECIPES_URL, {'limit': 100})
+        results = {item['id']: item for item in response.data['results']}
+        self.assertEqual(len(results), self.recipes_count)
+        for recipe in self.recipes:
+            item = results[recipe.pk]
+            self.assertEqual(item['is_favorited'], recipe == self.recipes[0])
+            self.assertEqual(item['is_in_shopping_cart'],
+                             recipe == self.recipes[1])
+            self.assertEqual(item['author']['is_subscribed'],
+                             recipe.author == self.authors[0])
+
+
+class SubscriptionsTest(APITestCase):
+    """Подписки с первыми recipes_limit рецептами авторов."""
+    url = '/api/users/subscriptions/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Follow.objects.bulk_create(
+            Follow(user=cls.user, following=author) for author in cls.authors
+        )
+
+    def test_queries_do_not_depend_on_page_size(self):
+        """Подсчёт, авторы и рецепты всех авторов страницы одним запросом."""
+        for limit in (1, 3):
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(3):
+                    response = self.user_client.get(
+                        self.url, {'limit': limit, 'recipes_limit': 2}
+                    )
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_recipes_limit(self):
+        response = self.user_client.get(self.url, {'recipes_limit': 2})
+        for item in response.data['results']:
+            self.assertEqual(len(item['recipes']), 2)
+            self.assertEqual(
+                item['recipes_count'],
+                Recipe.objects.filter(author_id=item['id']).count()
+            )
+
+    def test_invalid_recipes_limit(self):
+        """Нечисловое, нулевое и отрицательное значение - ошибка 400."""
+        author = create_user('author')
+        for value in ('x', '0', '-1'):
+            with self.subTest(recipes_limit=value):
+                response = self.user_client.get(self.url,
+                                                {'recipes_limit': value})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('recipes_limit', response.data)
+                response = self.user_client.post(
+                    f'/api/users/{author.pk}/subscribe/?recipes_limit={value}'
+                )
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Follow.objects.filter(following=author).exists())
+
+
+def make_cursor(cursor):
+    """Параметр cursor с произвольным содержимым."""
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+
+class CursorPaginationTest(APITestCase):
+    """Пагинация ленты по курсору."""
+
+    def test_walk_pages(self):
+        """Обход ленты по ссылкам next и возврат по ссылке previous."""
+        expected = list(Recipe.objects.values_list('pk', flat=True))
+        ids = []
+        pages = []
+        url = f'{RECIPES_URL}?cursor=&limit=5'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([item['id'] for item in response.data['results']])
+            ids.extend(pages[-1])
+            previous, url = response.data['previous'], response.data['next']
+        self.assertEqual(ids, expected)
+        response = self.client.get(previous)
+        self.assertEqual([item['id'] for item in response.data['results']],
+                         pages[-2])
+
+    def test_invalid_cursor(self):
+        """Неверный курсор, в том числе с неверными значениями, - 404."""
+        cursors = (
+            'not-base64!',
+            make_cursor({'v': ['garbage', 1], 'r': False}),
+            make_cursor({'v': [[1], {'id': 1}], 'r': False}),
+            make_cursor({'v': ['2020-01-01T00:00:00+00:00', 'x'],
+                         'r': False}),
+            make_cursor({'v': ['2020-01-01T00:00:00+00:00'], 'r': False}),
+            make_cursor({'r': False}),
+        )
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(RECIPES_URL, {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.data['detail'], 'Неверный курсор')
+
+
+class EstimatedCountPaginationTest(APITestCase):
+    """
+    Страницы ленты при неточной оценке количества рецептов: 12 рецептов,
+    по 5 на странице.
+    """
+
+    def get_pages(self, estimate):
+        """Ответы на страницы 1-4 при оценке количества estimate."""
+        with mock.patch.object(EstimatedCountPaginator,
+                               'exact_count_threshold', 0), \
+                mock.patch.object(EstimatedCountPaginator,
+                                  'get_table_estimate',
+                                  return_value=estimate):
+            return [self.client.get(RECIPES_URL, {'page': page, 'limit': 5})
+                    for page in range(1, 5)]
+
+    def assert_pages(self, responses, estimate):
+        first, second, last, empty = responses
+        for response in (first, second, last):
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['count'], estimate)
+            self.assertFalse(response.data['count_is_exact'])
+        self.assertEqual([len(response.data['results'])
+                          for response in (first, second, last)], [5, 5, 2])
+        self.assertIsNotNone(first.data['next'])
+        self.assertIsNotNone(second.data['next'])
+        self.assertIsNone(last.data['next'])
+        self.assertIsNotNone(last.data['previous'])
+        self.assertEqual(empty.status_code, 404)
+
+    def test_underestimated_count(self):
+        """Страницы за пределами оценки доступны и связаны ссылками next."""
+        self.assert_pages(self.get_pages(4), 4)
+
+    def test_overestimated_count(self):
+        """У последней страницы нет ссылки next, следующая - 404."""
+        self.assert_pages(self.get_pages(1000), 1000)
+
+
+class RecipeTagsFilterTest(APITestCase):
+    """Фильтр ленты по нескольким тегам, у рецептов по 1-3 тега."""
+
+    def test_overlapping_tags(self):
+        """Каждый рецепт один раз, count - количество различных рецептов."""
+        for slugs in (['tag0'], ['tag1', 'tag2'], ['tag0', 'tag1', 'tag2']):
+            with self.subTest(slugs=slugs):
+                expected = set(Recipe.objects.filter(
+                    tags__slug__in=slugs
+                ).values_list('pk', flat=True))
+                ids = []
+                url = RECIPES_URL
+                params = {'tags': slugs, 'limit': 5}
+                while url:
+                    response = self.client.get(url, params)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.data['count'], len(expected))
+                    ids.extend(item['id']
+                               for item in response.data['results'])
+                    url, params = response.data['next'], None
+                self.assertEqual(len(ids), len(set(ids)))
+                self.assertEqual(set(ids), expected)
+
+
+class RecipeSearchTest(APITestCase):
+    """
+    Поиск рецептов: в PostgreSQL по search_vector, который заполняет
+    триггер из миграции 0004, и по триграммам названия.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.soup = create_recipe(cls.authors[0], cls.tags[:1], {},
+                                 name='Грибной суп')
+        cls.soup_in_text = create_recipe(cls.authors[1], cls.tags[:1], {},
+                                         name='Гренки')
+        Recipe.objects.filter(pk=cls.soup_in_text.pk).update(
+            text='Подаются к супу'
+        )
+
+    def test_search_vector_filled(self):
+        """Триггер заполняет search_vector при создании рецепта."""
+        if connection.vendor != 'postgresql':
+            self.skipTest('search_vector заполняется только в PostgreSQL')
+        self.assertFalse(
+            Recipe.objects.filter(search_vector__isnull=True).exists()
+        )
+
+    def test_name_match_ranked_first(self):
+        """Совпадение в названии выше совпадения в описании."""
+        response = self.client.get(RECIPES_URL, {'search': 'суп'})
+        ids = [item['id'] for item in response.data['results']]
+        self.assertEqual(ids[0], self.soup.pk)
+        if connection.vendor == 'postgresql':
+            self.assertEqual(ids, [self.soup.pk, self.soup_in_text.pk])
+            self.assertEqual(response.data['count'], 2)
+
+
+class RecipeCreateQueriesTest(APITestCase):
+    """Количество запросов создания рецепта не зависит от его состава."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def create_recipe(self, ingredients_count):
+        """Создание рецепта с ingredients_count ингредиентами через API."""
+        response = self.user_client.post(RECIPES_URL, {
+            'name': f'Рецепт из {ingredients_count} ингредиентов',
+            'text': 'Описание',
+            'cooking_time': 15,
+            'image': IMAGE,
+            'tags': [tag.pk for tag in self.tags],
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': index + 1}
+                for index, ingredient
+                in enumerate(self.ingredients[:ingredients_count])
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(len(response.data['ingredients']),
+                         ingredients_count)
+
+    def test_create_queries(self):
+        """
+        Ингредиенты проверяются одним запросом in_bulk и записываются
+        одним bulk_create. Три тега загружаются PrimaryKeyRelatedField
+        по одному запросу на тег.
+        """
+        for ingredients_count in (3, 30):
+            with self.subTest(ingredients_count=ingredients_count):
+                with self.assertNumQueries(13):
+                    self.create_recipe(ingredients_count)
+
+    def test_unknown_ingredient(self):
+        """Ошибка для несуществующего ингредиента без создания рецепта."""
+        response = self.user_client.post(RECIPES_URL, {
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 15,
+            'image': IMAGE, 'tags': [self.tags[0].pk],
+            'ingredients': [{'id': self.ingredients[0].pk, 'amount': 1},
+                            {'id': 0, 'amount': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ingredients', response.data)
+        self.assertEqual(Recipe.objects.count(), self.recipes_count)
+
+
+class RecipeUpdateTest(APITestCase):
+    """Обновление ингредиентов рецепта по разнице составов."""
+
+    def test_ingredients_diff(self):
+        """
+        Изменённое количество записывается одним UPDATE только
+        изменённой строки, удалённый ингредиент удаляется, новый
+        добавляется, остальные строки не перезаписываются.
+        """
+        unchanged, changed, removed, added = self.ingredients[:4]
+        recipe = create_recipe(self.user, self.tags[:1],
+                               {unchanged: 1, changed: 2, removed: 3})
+        rows = {row.ingredient_id: row for row
+                in IngredientRecipe.objects.filter(recipe=recipe)}
+        table = IngredientRecipe._meta.db_table
+        with CaptureQueriesContext(connection) as context:
+            response = self.user_client.patch(
+                f'{RECIPES_URL}{recipe.pk}/',
+                {'tags': [self.tags[0].pk],
+                 'ingredients': [{'id': unchanged.pk, 'amount': 1},
+                                 {'id': changed.pk, 'amount': 20},
+                                 {'id': added.pk, 'amount': 4}]},
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            {row.ingredient_id: (row.pk, row.amount) for row
+             in IngredientRecipe.objects.filter(recipe=recipe)},
+            {unchanged.pk: (rows[unchanged.pk].pk, 1),
+             changed.pk: (rows[changed.pk].pk, 20),
+             added.pk: (mock.ANY, 4)}
+        )
+        updates = [query['sql'] for query in context.captured_queries
+                   if query['sql'].startswith(f'UPDATE "{table}"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(re.findall(r'IN \(([\d, ]+)\)', updates[0]),
+                         [str(rows[changed.pk].pk)])
+        inserts = [query['sql'] for query in context.captured_queries
+                   if query['sql'].startswith(f'INSERT INTO "{table}"')]
+        self.assertEqual(len(inserts), 1)
+
+    def test_unchanged_ingredients(self):
+        """Без изменений состава строки ингредиентов не записываются."""
+        recipe = create_recipe(self.user, self.tags[:1], {
+            ingredient: index + 1
+            for index, ingredient in enumerate(self.ingredients[:5])
+        })
+        table = IngredientRecipe._meta.db_table
+        with CaptureQueriesContext(connection) as context:
+            response = self.user_client.patch(
+                f'{RECIPES_URL}{recipe.pk}/',
+                {'tags': [self.tags[0].pk],
+                 'ingredients': [
+                     {'id': row.ingredient_id, 'amount': row.amount}
+                     for row in IngredientRecipe.objects.filter(recipe=recipe)
+                 ]},
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertFalse([
+            query['sql'] for query in context.captured_queries
+            if table in query['sql'] and not query['sql'].startswith('SELECT')
+        ])
+
+
+class RecipeImageUpdateTest(APITestCase):
+    """Замена изображения рецепта."""
+
+    def test_old_thumbnails_deleted(self):
+        """Файлы прежних миниатюр удаляются после фиксации транзакции."""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        recipe = create_recipe(self.user, self.tags[:1],
+                               {self.ingredients[0]: 1})
+        with override_settings(MEDIA_ROOT=media_root), \
+                mock.patch.object(images, 'executor') as executor:
+            for name in (recipe.thumbnail.name, recipe.thumbnail_webp.name):
+                default_storage.save(name, ContentFile(b'thumbnail'))
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.user_client.patch(
+                    f'{RECIPES_URL}{recipe.pk}/',
+                    {'image': IMAGE, 'tags': [self.tags[0].pk],
+                     'ingredients': [{'id': self.ingredients[0].pk,
+                                      'amount': 1}]},
+                    format='json'
+                )
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertFalse(default_storage.exists(recipe.thumbnail.name))
+            self.assertFalse(
+                default_storage.exists(recipe.thumbnail_webp.name)
+            )
+        recipe.refresh_from_db()
+        self.assertEqual((recipe.thumbnail, recipe.thumbnail_webp), ('', ''))
+        executor.submit.assert_called_once()
+
+
+class Base64ImageFieldTest(SimpleTestCase):
+    """Декодирование изображений в формате data URI."""
+
+    def decode(self, data):
+        return Base64ImageField().to_internal_value(data)
+
+    def assert_error(self, data, code):
+        with self.assertRaises(ValidationError) as context:
+            self.decode(data)
+        self.assertEqual(context.exception.get_codes(), [code])
+
+    def test_decode(self):
+        file = self.decode(IMAGE)
+        self.assertEqual(file.read(),
+                         base64.b64decode(IMAGE.split(',', 1)[1]))
+        self.assertEqual(file.name, 'temp.png')
+
+    def test_line_breaks(self):
+        """Данные base64 с переводами строк через 76 символов."""
+        data = IMAGE.split(',', 1)[1]
+        wrapped = '\r\n'.join(
+            data[index:index + 76] for index in range(0, len(data), 76)
+        )
+        file = self.decode(f'data:image/png;base64,{wrapped}\n')
+        self.assertEqual(file.read(), base64.b64decode(data))
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=10)
+    def test_large_image_on_disk(self):
+        file = self.decode(IMAGE)
+        self.assertIsInstance(file, TemporaryUploadedFile)
+        file.close()
+
+    @override_settings(RECIPE_IMAGE_MAX_SIZE=10)
+    def test_too_large(self):
+        self.assert_error(IMAGE, 'too_large')
+
+    def test_type_mismatch(self):
+        """Тип из data URI не совпадает с сигнатурой данных."""
+        self.assert_error(IMAGE.replace('image/png', 'image/jpeg'),
+                          'invalid_type')
+
+    def test_unsupported_type(self):
+        svg = base64.b64encode(b'<svg xmlns="http://www.w3.org/2000/svg"/>')
+        self.assert_error(f'data:image/svg+xml;base64,{svg.decode()}',
+                          'invalid_type')
+
+    def test_invalid_base64(self):
+        for data in ('data:image/png;base64,iVBO@@@@',
+                     'data:image/png;base64,iVBORw0',
+                     'data:image/png,iVBORw0KGgo='):
+            with self.subTest(data=data):
+                self.assert_error(data, 'invalid_base64')
+
+
+class ShoppingCartAggregateTest(APITestCase):
+    """
+    Сводный список покупок совпадает с суммой ингредиентов рецептов
+    из списков покупок при любом способе изменения данных.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.buyers = [cls.user] + [create_user(f'buyer{index}')
+                                   for index in range(3)]
+
+    def setUp(self):
+        super().setUp()
+        self.clients = {}
+
+    def get_client(self, user):
+        """Клиент, аутентифицированный как user."""
+        if user.pk not in self.clients:
+            self.clients[user.pk] = APIClient()
+            self.clients[user.pk].force_authenticate(user)
+        return self.clients[user.pk]
+
+    def assert_cart_consistent(self, msg=None):
+        """Сравнение сводного списка с пересчётом через Sum."""
+        expected = {
+            (row['recipe__shoplist__user'], row['ingredient']):
+                row['sum_amount']
+            for row in IngredientRecipe.objects
+            .filter(recipe__shoplist__isnull=False)
+            .values('recipe__shoplist__user', 'ingredient')
+            .annotate(sum_amount=Sum('amount'))
+        }
+        actual = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingCartIngredient.objects.values_list(
+                'user_id', 'ingredient_id', 'amount'
+            )
+        }
+        self.assertEqual(actual, expected, msg)
+
+    def add_to_cart(self, user, recipe):
+        response = self.get_client(user).post(
+            f'{RECIPES_URL}{recipe.pk}/shopping_cart/'
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def remove_from_cart(self, user, recipe):
+        response = self.get_client(user).delete(
+            f'{RECIPES_URL}{recipe.pk}/shopping_cart/'
+        )
+        self.assertEqual(response.status_code, 204)
+
+    def test_remove_after_amount_changed_outside_api(self):
+        """Изменение количества через ORM, как в админке, до удаления."""
+        recipe = self.recipes[0]
+        self.add_to_cart(self.user, recipe)
+        item = IngredientRecipe.objects.filter(recipe=recipe).first()
+        item.amount += 100
+        item.save()
+        self.assert_cart_consistent()
+        self.remove_from_cart(self.user, recipe)
+        self.assertFalse(ShoppingCartIngredient.objects.exists())
+
+    def test_delete_recipes_by_queryset(self):
+        """Удаление рецептов через QuerySet.delete(), как в админке."""
+        for buyer in self.buyers:
+            for recipe in self.recipes[:4]:
+                self.add_to_cart(buyer, recipe)
+        Recipe.objects.filter(pk__in=[recipe.pk
+                                      for recipe in self.recipes[:2]]).delete()
+        self.assert_cart_consistent()
+
+    def test_delete_author(self):
+        """Каскадное удаление рецептов вместе с автором."""
+        for buyer in self.buyers:
+            for recipe in self.recipes[:6]:
+                self.add_to_cart(buyer, recipe)
+        self.authors[0].delete()
+        self.buyers[1].delete()
+        self.assert_cart_consistent()
+
+    def patch_queries(self, kept):
+        """
+        Количество запросов PATCH, оставляющего kept из 40 ингредиентов
+        рецепта в списках покупок трёх пользователей.
+        """
+        recipe = create_recipe(self.authors[0], self.tags[:1], {
+            ingredient: index + 1
+            for index, ingredient in enumerate(self.ingredients)
+        })
+        for buyer in self.buyers[1:]:
+            self.add_to_cart(buyer, recipe)
+        with CaptureQueriesContext(connection) as context:
+            response = self.get_client(recipe.author).patch(
+                f'{RECIPES_URL}{recipe.pk}/',
+                {'tags': [self.tags[0].pk],
+                 'ingredients': [{'id': ingredient.pk, 'amount': 1000}
+                                 for ingredient in self.ingredients[:kept]]},
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assert_cart_consistent(f'Осталось ингредиентов: {kept}')
+        return len(context.captured_queries)
+
+    def test_patch_removed_ingredients_queries(self):
+        """Удалённые ингредиенты учитываются одним пересчётом списков."""
+        self.assertEqual(self.patch_queries(39), self.patch_queries(1))
+
+    def test_random_changes(self):
+        """Случайная последовательность изменений через API и ORM."""
+        generator = random.Random(5)
+        recipes = list(self.recipes)
+        carts = {buyer.pk: set() for buyer in self.buyers}
+
+        def add_to_cart():
+            buyer = generator.choice(self.buyers)
+            recipe = generator.choice(recipes)
+            if recipe.pk not in carts[buyer.pk]:
+                self.add_to_cart(buyer, recipe)
+                carts[buyer.pk].add(recipe.pk)
+
+        def remove_from_cart():
+            buyer = generator.choice(self.buyers)
+            recipe = generator.choice(recipes)
+            if recipe.pk in carts[buyer.pk]:
+                self.remove_from_cart(buyer, recipe)
+                carts[buyer.pk].discard(recipe.pk)
+
+        def update_recipe():
+            recipe = generator.choice(recipes)
+            ingredients = generator.sample(self.ingredients,
+                                           generator.randint(1, 6))
+            response = self.get_client(recipe.author).patch(
+                f'{RECIPES_URL}{recipe.pk}/',
+                {'tags': [self.tags[0].pk],
+                 'ingredients': [{'id': ingredient.pk,
+                                  'amount': generator.randint(1, 500)}
+                                 for ingredient in ingredients]},
+                format='json'
+            )
+            self.assertEqual(response.status_code, 200)
+
+        def change_amount():
+            item = IngredientRecipe.objects.filter(
+                recipe=generator.choice(recipes)
+            ).order_by('?').first()
+            if item is not None:
+                item.amount = generator.randint(1, 500)
+                item.save()
+
+        def add_ingredient():
+            recipe = generator.choice(recipes)
+            ingredient = generator.choice(self.ingredients)
+            if not IngredientRecipe.objects.filter(
+                recipe=recipe, ingredient=ingredient
+            ).exists():
+                IngredientRecipe.objects.create(
+                    recipe=recipe, ingredient=ingredient,
+                    amount=generator.randint(1, 500)
+                )
+
+        def delete_ingredient():
+            item = IngredientRecipe.objects.filter(
+                recipe=generator.choice(recipes)
+            ).order_by('?').first()
+            if item is not None:
+                item.delete()
+
+        def delete_recipe():
+            if len(recipes) > 4:
+                recipe = recipes.pop(generator.randrange(len(recipes)))
+                response = self.get_client(recipe.author).delete(
+                    f'{RECIPES_URL}{recipe.pk}/'
+                )
+                self.assertEqual(response.status_code, 204)
+                for cart in carts.values():
+                    cart.discard(recipe.pk)
+
+        operations = (add_to_cart, add_to_cart, add_to_cart, remove_from_cart,
+                      update_recipe, change_amount, add_ingredient,
+                      delete_ingredient, delete_recipe)
+        for step in range(200):
+            operation = generator.choice(operations)
+            operation()
+            self.assert_cart_consistent(f'Шаг {step}: {operation.__name__}')
+
+
+class ShoppingCartAutocommitTest(TransactionTestCase):
+    """
+    Изменения списков покупок вне транзакции, как из shell или команд:
+    блокировка пользователей требует транзакции, которую открывает
+    change_amounts.
+    """
+
+    def test_orm_changes_without_transaction(self):
+        user = create_user('user')
+        recipe = create_recipe(create_user('author'), [], {})
+        ingredient = Ingredient.objects.create(name='Соль',
+                                               measurement_unit='г')
+        IngredientRecipe.objects.create(recipe=recipe, ingredient=ingredient,
+                                        amount=5)
+        ShoppingList.objects.create(user=user, recipe=recipe)
+        IngredientRecipe.objects.create(
+            recipe=recipe, amount=7,
+            ingredient=Ingredient.objects.create(name='Перец',
+                                                 measurement_unit='г')
+        )
+        self.assertEqual(
+            ShoppingCartIngredient.objects.aggregate(Sum('amount')),
+            {'amount__sum': 12}
+        )
+
+
+class CachedTokenAuthenticationTest(TestCase):
+    """Пользователь токена в кэше без хэша пароля."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('user')
+        self.user.set_password('old-Passw0rd')
+        self.user.save()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_password_not_cached(self):
+        """В кэше нет хэша пароля, повторный запрос не читает токен."""
+        self.assertEqual(self.client.get(ME_URL).status_code, 200)
+        cached = cache.get(get_token_cache_key(self.token.key))
+        self.assertEqual(set(cached), set(CACHED_USER_FIELDS))
+        self.assertNotIn(self.user.password, cached.values())
+        with self.assertNumQueries(0):
+            response = self.client.get(ME_URL)
+        self.assertEqual(response.data['email'], self.user.email)
+
+    def test_set_password_with_cached_user(self):
+        """
+        Смена пароля пользователем из кэша не перезаписывает остальные поля
+        значениями из кэша.
+        """
+        self.client.get(ME_URL)
+        User.objects.filter(pk=self.user.pk).update(first_name='Новое')
+        response = self.client.post('/api/users/set_password/', {
+            'current_password': 'old-Passw0rd',
+            'new_password': 'new-Passw0rd'
+        })
+        self.assertEqual(response.status_code, 204)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('new-Passw0rd'))
+        self.assertEqual(self.user.first_name, 'Новое')
+
+    def test_deactivated_user(self):
+        """Сохранение пользователя удаляет его токен из кэша."""
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(ME_URL).status_code, 401)
+
+
+class RequestMetricsTest(APITestCase):
+    """Метрики запросов к базе данных при WSGI и ASGI."""
+
+    def test_async_views_not_mounted(self):
+        """Без ASYNC_VIEWS запросы обрабатывают вьюсеты."""
+        self.assertIs(resolve('/api/tags/').func.cls, TagViewSet)
+
+    @override_settings(REQUEST_METRICS_HEADERS=True)
+    def test_wsgi_queries_header(self):
+        response = self.client.get(RECIPES_URL)
+        self.assertGreater(int(response['X-DB-Queries']), 0)
+
+    @override_settings(SLOW_REQUEST_QUERIES=0)
+    def test_slow_request_log(self):
+        """Время и количество запросов - WARNING, текст SQL - DEBUG."""
+        with self.assertLogs('api.middleware', 'DEBUG') as logs:
+            self.client.get(RECIPES_URL)
+        warning, debug = logs.records
+        self.assertEqual(warning.levelname, 'WARNING')
+        self.assertIn('SQL-запросов', warning.getMessage())
+        self.assertNotIn('SELECT', warning.getMessage())
+        self.assertEqual(debug.levelname, 'DEBUG')
+        self.assertIn('SELECT', debug.getMessage())
+
+    @override_settings(REQUEST_METRICS_HEADERS=True)
+    async def test_asgi_queries_header(self):
+        """Запросы ORM в потоке sync_to_async попадают в метрики."""
+        response = await AsyncClient().get(RECIPES_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(response['X-DB-Queries']), 0)
+
+
+class ShoppingCartJobTest(APITestCase):
+    """Построение PDF-файла списка покупок в фоновом процессе."""
+
+    def setUp(self):
+        super().setUp()
+        ShoppingList.objects.create(user=self.user, recipe=self.recipes[0])
+        files_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, files_root, ignore_errors=True)
+        patcher = mock.patch.object(shopping_cart, 'storage',
+                                    FileSystemStorage(files_root))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_files_outside_media_root(self):
+        """Файлы не попадают в MEDIA_ROOT, который раздаёт nginx."""
+        root = os.path.abspath(settings.SHOPPING_CART_FILES_ROOT)
+        media_root = os.path.abspath(settings.MEDIA_ROOT)
+        self.assertNotEqual(os.path.commonpath([root, media_root]),
+                            media_root)
+
+    def test_pdf_job(self):
+        """Файл строится в процессе пула и отдаётся только владельцу."""
+        response = self.user_client.get(
+            f'{RECIPES_URL}download_shopping_cart/', {'async': 1}
+        )
+        self.assertEqual(response.status_code, 202)
+        job_id, url = response.data['id'], response.data['url']
+        deadline = time.monotonic() + 60
+        while response.status_code == 202 and time.monotonic() < deadline:
+            time.sleep(0.1)
+            response = self.user_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(
+            b''.join(response.streaming_content).startswith(b'%PDF')
+        )
+        self.assertTrue(shopping_cart.storage.exists(
+            shopping_cart.get_file_name(self.user.pk, job_id)
+        ))
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+
+class DownloadShoppingCartTest(APITestCase):
+    """Скачивание списка покупок в разных форматах."""
+    url = f'{RECIPES_URL}download_shopping_cart/'
+
+    def setUp(self):
+        super().setUp()
+        ShoppingList.objects.create(user=self.user, recipe=self.recipes[0])
+        ShoppingList.objects.create(user=self.user, recipe=self.recipes[1])
+        self.expected = {
+            (ingredient.name, ingredient.measurement_unit, amount)
+            for ingredient, amount in zip(self.ingredients, (1, 3, 3, 2))
+        }
+
+    def download(self, **kwargs):
+        response = self.user_client.get(self.url, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_formats(self):
+        """Параметр format выбирает тип файла, по умолчанию - PDF."""
+        content_types = {
+            'txt': 'text/plain; charset=utf-8',
+            'csv': 'text/csv; charset=utf-8',
+            'json': 'application/json; charset=utf-8',
+            'pdf': 'application/pdf',
+        }
+        for file_format, content_type in content_types.items():
+            with self.subTest(format=file_format):
+                response, _ = self.download(data={'format': file_format})
+                self.assertEqual(response['Content-Type'], content_type)
+                self.assertIn(f'filename="shoplist.{file_format}"',
+                              response['Content-Disposition'])
+        response, content = self.download()
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(content.startswith(b'%PDF'))
+
+    def test_accept(self):
+        """Формат выбирается по заголовку Accept."""
+        for media_type in ('text/plain', 'text/csv', 'application/json'):
+            with self.subTest(accept=media_type):
+                response, _ = self.download(HTTP_ACCEPT=media_type)
+                self.assertEqual(response['Content-Type'],
+                                 f'{media_type}; charset=utf-8')
+
+    def test_txt(self):
+        """Текст в формате PDF-файла: строка на ингредиент."""
+        content = self.download(data={'format': 'txt'})[1].decode()
+        lines = content.splitlines()
+        self.assertEqual(lines[0], 'Список покупок:')
+        self.assertEqual(
+            {re.sub(r'^\d+\. ', '', line) for line in lines[1:]},
+            {f'{name} - {amount} {unit}'
+             for name, unit, amount in self.expected}
+        )
+
+    def test_csv(self):
+        """CSV с заголовком и строкой на ингредиент."""
+        content = self.download(data={'format': 'csv'})[1].decode()
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[0], ['name', 'measurement_unit', 'amount'])
+        self.assertEqual(
+            {tuple(row) for row in rows[1:]},
+            {(name, unit, str(amount))
+             for name, unit, amount in self.expected}
+        )
+
+    def test_json(self):
+        """Массив объектов с суммарным количеством."""
+        content = self.download(data={'format': 'json'})[1].decode()
+        self.assertEqual(
+            {(row['name'], row['measurement_unit'], row['amount'])
+             for row in json.loads(content)},
+            self.expected
+        )
+
+    def test_empty(self):
+        """Пустой список покупок в JSON - пустой массив."""
+        ShoppingList.objects.filter(user=self.user).delete()
+        content = self.download(data={'format': 'json'})[1].decode()
+        self.assertEqual(json.loads(content), [])
+
+    def test_unsupported_format(self):
+        """Для неизвестного формата возвращается ошибка 406, а не 404."""
+        for kwargs in ({'data': {'format': 'xml'}},
+                       {'HTTP_ACCEPT': 'application/xml'}):
+            with self.subTest(**kwargs):
+                response = self.user_client.get(self.url, **kwargs)
+                self.assertEqual(response.status_code, 406)
+                self.assertEqual(response['Content-Type'],
+                                 'application/json')
+                self.assertIn('detail', response.json())
+
+    async def test_async_view(self):
+        """Асинхронный view выбирает формат так же, как вьюсет."""
+        token = await Token.objects.acreate(user=self.user)
+        factory = AsyncRequestFactory()
+        headers = {'authorization': f'Token {token.key}'}
+        response = await async_views.download_shopping_cart(
+            factory.get(self.url, {'format': 'csv'}, **headers)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        response = await async_views.download_shopping_cart(
+            factory.get(self.url, {'format': 'xml'}, **headers)
+        )
+        self.assertEqual(response.status_code, 406)
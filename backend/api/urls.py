@@ -1,7 +1,11 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
+from .async_views import (download_shopping_cart, ingredient_list,
+                          recipe_detail, tag_detail, tag_list)
+from .views import (IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet,
+                    metrics)
 
 app_name = 'api'
 
@@ -14,4 +18,15 @@ router.register('recipes', RecipeViewSet, basename='recipes')
 urlpatterns = [
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
+    path('metrics/', metrics, name='metrics'),
 ]
+
+if settings.ASYNC_VIEWS:
+    urlpatterns = [
+        path('tags/', tag_list, name='tags-list'),
+        path('tags/<int:pk>/', tag_detail, name='tags-detail'),
+        path('ingredients/', ingredient_list, name='ingredients-list'),
+        path('recipes/download_shopping_cart/', download_shopping_cart,
+             name='recipes-download-shopping-cart'),
+        path('recipes/<int:pk>/', recipe_detail, name='recipes-detail'),
+    ] + urlpatterns
@@ -1,46 +1,196 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+import csv
+import io
+import json
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.db.models import F
+from django.http import FileResponse, StreamingHttpResponse
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 
-from recipes.models import IngredientRecipe
+from recipes.models import ShoppingCartIngredient
 
+FONT_NAME = 'DejaVu'
+FONT_PATH = os.path.join(settings.BASE_DIR, 'fonts', 'DejaVuSansCondensed.ttf')
+PDF_SPOOL_MAX_SIZE = 1024 * 1024
+PDF_CHUNK_SIZE = 64 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+SHOP_CART_FIELDS = ('name', 'measurement_unit', 'amount')
 
-def download_shop_cart(user):
-    """Функция для скачивания списка ингредиентов из списка покупок."""
-    shop_ingredients = (
-        IngredientRecipe.objects
-        .filter(recipe__shoplist__user=user)
-        .values('ingredient__name', 'ingredient__measurement_unit')
-        .annotate(sum_amount=Sum('amount'))
+
+def register_fonts():
+    """Регистрация шрифта для PDF, выполняется один раз при запуске."""
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+
+class PDFPageRenderer:
+    """
+    Построчный вывод текста в PDF с автоматическим переходом
+    на новую страницу.
+    """
+    top = 800
+    bottom = 70
+    left = 40
+    line_height = 20
+    font_size = 14
+
+    def __init__(self, file):
+        self.canvas = canvas.Canvas(file)
+        self.height = self.top
+        self.canvas.setFont(FONT_NAME, self.font_size)
+
+    def new_page(self, height=None):
+        """Переход на новую страницу с сохранением шрифта."""
+        self.canvas.showPage()
+        self.canvas.setFont(FONT_NAME, self.font_size)
+        self.height = height or self.top
+
+    def write_line(self, text, indent=None):
+        """Вывод строки с отступом после неё."""
+        if self.height < self.bottom:
+            self.new_page()
+        self.canvas.drawString(self.left, self.height, text)
+        self.height -= indent or self.line_height
+
+    def write_footer(self, text):
+        """Вывод заключительной строки после основного текста."""
+        if self.height < self.bottom + 10:
+            self.new_page(self.top + 30)
+        self.canvas.drawString(self.left, self.height - 30, text)
+
+    def save(self):
+        """Завершение последней страницы и запись документа в файл."""
+        self.canvas.showPage()
+        self.canvas.save()
+
+
+class ShoppingListResponse(FileResponse):
+    """Потоковая отдача готового PDF частями."""
+    block_size = PDF_CHUNK_SIZE
+
+
+def shop_cart_ingredients(user):
+    """Ингредиенты списка покупок user, сначала самые большие количества."""
+    return (
+        ShoppingCartIngredient.objects
+        .filter(user=user)
+        .values('ingredient__name', 'ingredient__measurement_unit',
+                sum_amount=F('amount'))
         .order_by('-sum_amount')
     )
-    file = HttpResponse(content_type='application/pdf')
-    file['Content-Disposition'] = 'attachment; filename=shoplist.pdf'
-    shoplist = canvas.Canvas(file)
-    pdfmetrics.registerFont(TTFont('DejaVu', 'fonts/DejaVuSansCondensed.ttf'))
-    shoplist.setFont('DejaVu', 14)
-    height = 800
-    shoplist.drawString(40, height, 'Список покупок:')
-    height -= 40
-    count = 1
-    for ingredient in shop_ingredients:
-        if height < 70:
-            shoplist.showPage()
-            height = 800
-        shoplist.drawString(40, height, (
+
+
+def shop_cart_rows(user):
+    """Кортежи SHOP_CART_FIELDS списка покупок user для потоковой выгрузки."""
+    return shop_cart_ingredients(user).values_list(
+        'ingredient__name', 'ingredient__measurement_unit', 'sum_amount'
+    )
+
+
+class Echo:
+    """Файл, возвращающий записанную строку, для потокового вывода CSV."""
+
+    def write(self, value):
+        return value
+
+
+def write_txt(rows):
+    """Список покупок в виде текста, как в PDF-файле."""
+    yield 'Список покупок:\n'
+    for count, (name, measurement_unit, amount) in enumerate(rows, 1):
+        yield f'{count}. {name} - {amount} {measurement_unit}\n'
+
+
+def write_csv(rows):
+    """Список покупок в формате CSV с заголовком SHOP_CART_FIELDS."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(SHOP_CART_FIELDS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def write_json(rows):
+    """Список покупок в виде массива объектов JSON."""
+    separator = '['
+    for row in rows:
+        yield separator + json.dumps(dict(zip(SHOP_CART_FIELDS, row)),
+                                     ensure_ascii=False,
+                                     separators=(',', ':'))
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+SHOP_CART_WRITERS = {
+    'txt': write_txt,
+    'csv': write_csv,
+    'json': write_json,
+}
+
+
+def encode_chunks(parts, size=STREAM_CHUNK_SIZE):
+    """Объединение строк parts в части по size символов в UTF-8."""
+    chunk = []
+    length = 0
+    for part in parts:
+        chunk.append(part)
+        length += len(part)
+        if length >= size:
+            yield ''.join(chunk).encode()
+            chunk = []
+            length = 0
+    if chunk:
+        yield ''.join(chunk).encode()
+
+
+def stream_shop_cart(rows, renderer):
+    """
+    Потоковая выгрузка строк shop_cart_rows в текстовом формате renderer
+    без построения объектов и сериализаторов.
+    """
+    response = StreamingHttpResponse(
+        encode_chunks(SHOP_CART_WRITERS[renderer.format](rows)),
+        content_type=f'{renderer.media_type}; charset=utf-8'
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="shoplist.{renderer.format}"'
+    )
+    return response
+
+
+def write_shop_cart(file, shop_ingredients):
+    """Запись PDF-файла списка покупок из строк shop_cart_ingredients."""
+    shoplist = PDFPageRenderer(file)
+    shoplist.write_line('Список покупок:', indent=40)
+    for count, ingredient in enumerate(shop_ingredients, 1):
+        shoplist.write_line(
             f'{count}. {ingredient["ingredient__name"]} - '
             f'{ingredient["sum_amount"]} '
             f'{ingredient["ingredient__measurement_unit"]}'
-        ))
-        count += 1
-        height -= 20
-    if height < 80:
-        shoplist.showPage()
-        height = 830
-    shoplist.drawString(40, height - 30,
-                        'Спасибо за использование сервиса Foodgram.')
-    shoplist.showPage()
+        )
+    shoplist.write_footer('Спасибо за использование сервиса Foodgram.')
     shoplist.save()
-    return file
+
+
+def render_shop_cart(shop_ingredients):
+    """Ответ с PDF-файлом списка покупок из строк shop_cart_ingredients."""
+    file = SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_SIZE)
+    write_shop_cart(file, shop_ingredients)
+    file.seek(0)
+    return ShoppingListResponse(file, as_attachment=True,
+                                filename='shoplist.pdf',
+                                content_type='application/pdf')
+
+
+def shop_cart_pdf(shop_ingredients):
+    """Содержимое PDF-файла списка покупок для построения в другом процессе."""
+    file = io.BytesIO()
+    write_shop_cart(file, shop_ingredients)
+    return file.getvalue()
+
+
+def download_shop_cart(user):
+    """Функция для скачивания списка ингредиентов из списка покупок."""
+    return render_shop_cart(shop_cart_ingredients(user).iterator())
@@ -1,3 +1,6 @@
+from django.db import transaction
+from django.db.models import Count, Prefetch, Value
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.serializers import SetPasswordSerializer
@@ -5,15 +8,23 @@ from rest_framework import mixins, permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from .filters import IngredientSearchFilter, RecipeFilter
-from .pagination import FoodgramPagination
+from .filters import IngredientSearchFilter, RecipeFilter, search_ingredients
+from .metrics import render_metrics
+from .mixins import AnonymousCacheMixin, ConditionalGetMixin
+from .pagination import FoodgramEstimatedCountPagination, FoodgramPagination
 from .permissions import IsAuthorAdminOrReadOnly
+from .renderers import SHOPPING_LIST_RENDERERS, ShoppingListNegotiation
 from .serializers import (IngredientSerializer, RecipeReadMaxSerializer,
                           RecipeReadMinSerializer,
                           RecipeСreateUpdateDeleteSerializer, ShoppingList,
                           TagSerializer, UserCreateSerializer,
-                          UserReadSerializer, UserSubscriptionsSerializer)
-from .utils import download_shop_cart
+                          UserReadSerializer, UserSubscriptionsSerializer,
+                          get_recipes_limit)
+from .shopping_cart import (get_job_file, is_job_requested, job_status,
+                            start_job)
+from .utils import (SHOP_CART_WRITERS, ShoppingListResponse,
+                    download_shop_cart, shop_cart_ingredients, shop_cart_rows,
+                    stream_shop_cart)
 from recipes.models import Favorite, Ingredient, Recipe, Tag
 from users.models import Follow, User
 
@@ -32,6 +43,22 @@ class UserViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
             return UserReadSerializer
         return self.serializer_class
 
+    def annotate_subscriptions(self, queryset):
+        """
+        Добавление к авторам из подписок количества рецептов и первых
+        recipes_limit рецептов, загружаемых одним запросом для всех авторов.
+        """
+        recipes = Recipe.objects.all()
+        recipes_limit = get_recipes_limit(self.request)
+        if recipes_limit:
+            recipes = recipes.first_per_author(recipes_limit)
+        return queryset.annotate(
+            recipes_count=Count('recipes', distinct=True),
+            is_subscribed=Value(True)
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+        )
+
     @action(detail=False, methods=['get'],
             permission_classes=(permissions.IsAuthenticated,))
     def me(self, request):
@@ -52,7 +79,7 @@ class UserViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
                                            context={'request': request})
         if serializer.is_valid(raise_exception=True):
             self.request.user.set_password(serializer.data['new_password'])
-            self.request.user.save()
+            self.request.user.save(update_fields=('password',))
         return Response('Пароль успешно изменён',
                         status=status.HTTP_204_NO_CONTENT)
 
@@ -64,7 +91,9 @@ class UserViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
         Дополнительный URL эндпоинт 'users/subscriptions' для просмотра
         подписок пользователя.
         """
-        followings = User.objects.filter(following__user=self.request.user)
+        followings = self.annotate_subscriptions(
+            User.objects.filter(following__user=self.request.user)
+        )
         paginated_followings = self.paginate_queryset(followings)
         serializer = UserSubscriptionsSerializer(paginated_followings,
                                                  many=True,
@@ -92,6 +121,9 @@ class UserViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
                     {'errors': 'Уже есть подписка на данного автора'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            author = self.annotate_subscriptions(
+                User.objects.filter(pk=author.pk)
+            ).get()
             serializer = UserSubscriptionsSerializer(
                 author,
                 data=request.data,
@@ -113,30 +145,49 @@ class UserViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
         )
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для просмотра тегов."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (permissions.AllowAny,)
+    cache_generation = 'tags'
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для просмотра ингредиентов."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (permissions.AllowAny,)
+    cache_generation = 'ingredients'
     filter_backends = (IngredientSearchFilter,)
-    search_fields = ('^name', )
 
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(self.list_ingredients, request,
+                                         *args, **kwargs)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+    def list_ingredients(self, request, *args, **kwargs):
+        """Поиск ингредиентов, см. search_ingredients."""
+        ingredients = search_ingredients(self.get_queryset(),
+                                         request.query_params)
+        if isinstance(ingredients, list):
+            return Response(ingredients)
+        serializer = self.get_serializer(ingredients, many=True)
+        return Response(serializer.data)
+
+
+class RecipeViewSet(AnonymousCacheMixin, viewsets.ModelViewSet):
     """Вьюсет для рецептов."""
     queryset = Recipe.objects.all()
     serializer_class = RecipeСreateUpdateDeleteSerializer
-    pagination_class = FoodgramPagination
+    pagination_class = FoodgramEstimatedCountPagination
     permission_classes = (IsAuthorAdminOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    cache_generation = 'recipes'
+
+    def get_queryset(self):
+        """Рецепты со связанными данными и флагами для автора запроса."""
+        return Recipe.objects.for_feed(self.request.user)
 
     def get_serializer_class(self):
         """Выбор сериализатора в зависимости от вида запроса."""
@@ -172,6 +223,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=(permissions.IsAuthenticated,))
+    @transaction.atomic
     def shopping_cart(self, request, *args, **kwargs):
         """
         Дополнительный URL эндпоинт 'recipes/{id}/shopping_cart'
@@ -197,11 +249,58 @@ class RecipeViewSet(viewsets.ModelViewSet):
                         status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, methods=['get'],
+            renderer_classes=SHOPPING_LIST_RENDERERS,
+            content_negotiation_class=ShoppingListNegotiation,
             permission_classes=(permissions.IsAuthenticated,))
-    def download_shopping_cart(self, request):
+    def download_shopping_cart(self, request, format=None):
         """
         Дополнительный URL эндпоинт 'recipes/download_shopping_cart'
-        для скачивания списка ингредиентов из списка покупок.
+        для скачивания списка ингредиентов из списка покупок. Формат
+        выбирается параметром format или заголовком Accept: pdf (по
+        умолчанию), txt, csv или json, для других форматов - ошибка 406.
+        Текстовые форматы выгружаются потоком прямо из запроса к базе
+        данных. С параметром async=true
+        PDF-файл строится в фоне, а в ответе возвращается идентификатор
+        задачи и адрес для скачивания файла.
         """
-        user = get_object_or_404(User, pk=self.request.user.pk)
-        return download_shop_cart(user)
+        if request.accepted_renderer.format in SHOP_CART_WRITERS:
+            return stream_shop_cart(
+                shop_cart_rows(self.request.user).iterator(),
+                request.accepted_renderer
+            )
+        if not is_job_requested(request):
+            return download_shop_cart(self.request.user)
+        job_id, ready = start_job(
+            self.request.user,
+            list(shop_cart_ingredients(self.request.user))
+        )
+        data, status_code = job_status(request, job_id, ready)
+        return Response(data, status=status_code)
+
+    @action(detail=False, methods=['get'],
+            url_path=r'download_shopping_cart/(?P<job_id>[0-9a-f]{64})',
+            permission_classes=(permissions.IsAuthenticated,))
+    def shopping_cart_file(self, request, job_id):
+        """
+        Дополнительный URL эндпоинт 'recipes/download_shopping_cart/{id}'
+        для скачивания PDF-файла, построенного в фоне.
+        """
+        try:
+            file = get_job_file(self.request.user, job_id)
+        except FileNotFoundError:
+            return Response({'errors': 'Задача не найдена, запросите '
+                                       'список покупок заново'},
+                            status=status.HTTP_404_NOT_FOUND)
+        if file is None:
+            data, status_code = job_status(request, job_id, False)
+            return Response(data, status=status_code)
+        return ShoppingListResponse(file, as_attachment=True,
+                                    filename='shoplist.pdf',
+                                    content_type='application/pdf')
+
+
+def metrics(request):
+    """Метрики запросов к API в текстовом формате Prometheus."""
+    return HttpResponse(render_metrics(),
+                        content_type='text/plain; version=0.0.4; '
+                                     'charset=utf-8')
@@ -0,0 +1,255 @@
+"""
+Нагрузочное тестирование API на данных из команды seed_foodhelper.
+
+Виртуальные пользователи входят под сгенерированными учётными записями
+и в течение --duration секунд выполняют смешанную нагрузку: просмотр
+ленты и рецептов, фильтрацию по тегам, добавление в избранное, подписки,
+работу со списком покупок и его скачивание. По окончании выводятся
+количество запросов, ошибок и задержки p50/p95/p99 по каждому эндпоинту.
+
+Пример запуска против локального сервера:
+    python loadtest.py --host http://localhost:8000 --users 20 --duration 60
+"""
+import argparse
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+
+USERNAME_PREFIX = 'seed_'
+
+SCENARIOS = {
+    'browse_feed': 30,
+    'browse_anonymous_feed': 10,
+    'view_recipe': 15,
+    'filter_by_tags': 10,
+    'search_ingredients': 5,
+    'toggle_favorite': 10,
+    'toggle_subscription': 5,
+    'view_subscriptions': 5,
+    'toggle_shopping_cart': 5,
+    'download_shopping_cart': 5,
+}
+
+
+class Stats:
+    """Задержки и ошибки запросов, общие для всех потоков."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def add(self, label, latency, error):
+        with self.lock:
+            self.latencies[label].append(latency)
+            if error:
+                self.errors[label] += 1
+
+    def report(self, duration):
+        """Таблица с задержками в миллисекундах по эндпоинтам."""
+        header = (f'{"Эндпоинт":48} {"Запросов":>8} {"Ошибок":>7} '
+                  f'{"p50":>8} {"p95":>8} {"p99":>8} {"max":>8}')
+        lines = [header, '-' * len(header)]
+        total = 0
+        for label in sorted(self.latencies):
+            latencies = [latency * 1000 for latency in self.latencies[label]]
+            total += len(latencies)
+            if len(latencies) > 1:
+                cuts = statistics.quantiles(latencies, n=100,
+                                            method='inclusive')
+                p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+            else:
+                p50 = p95 = p99 = latencies[0]
+            lines.append(
+                f'{label:48} {len(latencies):8} {self.errors[label]:7} '
+                f'{p50:8.1f} {p95:8.1f} {p99:8.1f} {max(latencies):8.1f}'
+            )
+        lines.append(f'Всего запросов: {total}, '
+                     f'{total / duration:.1f} запросов в секунду')
+        return '\n'.join(lines)
+
+
+class VirtualUser(threading.Thread):
+    """Пользователь, выполняющий случайные сценарии до момента deadline."""
+
+    def __init__(self, options, index, stats, deadline):
+        super().__init__(daemon=True)
+        self.options = options
+        self.index = index
+        self.stats = stats
+        self.deadline = deadline
+        self.random = random.Random(options.seed + index)
+        url = urlsplit(options.host)
+        connection_class = (http.client.HTTPSConnection
+                            if url.scheme == 'https'
+                            else http.client.HTTPConnection)
+        self.connection = connection_class(url.netloc,
+                                           timeout=options.timeout)
+        self.token = None
+        self.recipe_ids = []
+        self.author_ids = []
+        self.tags = []
+
+    def request(self, method, path, label, body=None, anonymous=False):
+        """
+        Запрос к API с замером времени. Ошибкой считаются ответы 5xx
+        и сетевые ошибки, ответы 4xx ожидаемы при повторных действиях.
+        """
+        headers = {'Content-Type': 'application/json'}
+        if self.token and not anonymous:
+            headers['Authorization'] = f'Token {self.token}'
+        started = time.perf_counter()
+        try:
+            self.connection.request(
+                method, path, headers=headers,
+                body=json.dumps(body) if body is not None else None
+            )
+            response = self.connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.stats.add(f'{method} {label}',
+                           time.perf_counter() - started, True)
+            return None, None
+        self.stats.add(f'{method} {label}', time.perf_counter() - started,
+                       response.status >= 500)
+        if 'json' not in response.getheader('Content-Type', ''):
+            return response.status, None
+        return response.status, json.loads(content) if content else None
+
+    def login(self):
+        """Получение токена сгенерированного пользователя."""
+        account = self.index % self.options.accounts
+        status, data = self.request(
+            'POST', '/api/auth/token/login/', '/api/auth/token/login/',
+            body={'email': f'{USERNAME_PREFIX}{account}@example.com',
+                  'password': self.options.password}
+        )
+        if status != 200:
+            raise RuntimeError(f'Не удалось войти как '
+                               f'{USERNAME_PREFIX}{account}: {status}')
+        self.token = data['auth_token']
+
+    def remember(self, data):
+        """Запоминание рецептов и авторов из ответа со списком рецептов."""
+        if not data:
+            return
+        for recipe in data.get('results', ()):
+            self.recipe_ids.append(recipe['id'])
+            self.author_ids.append(recipe['author']['id'])
+        del self.recipe_ids[:-100], self.author_ids[:-100]
+
+    def browse_feed(self, anonymous=False):
+        page = self.random.randint(1, self.options.pages)
+        _, data = self.request('GET', f'/api/recipes/?page={page}&limit=6',
+                               '/api/recipes/?page=', anonymous=anonymous)
+        self.remember(data)
+
+    def browse_anonymous_feed(self):
+        self.browse_feed(anonymous=True)
+
+    def view_recipe(self):
+        if self.recipe_ids:
+            recipe_id = self.random.choice(self.recipe_ids)
+            self.request('GET', f'/api/recipes/{recipe_id}/',
+                         '/api/recipes/{id}/')
+
+    def filter_by_tags(self):
+        if self.tags:
+            tags = self.random.sample(self.tags,
+                                      self.random.randint(1, len(self.tags)))
+            query = urlencode([('tags', slug) for slug in tags])
+            _, data = self.request('GET', f'/api/recipes/?{query}&limit=6',
+                                   '/api/recipes/?tags=')
+            self.remember(data)
+
+    def search_ingredients(self):
+        name = self.random.choice(('мук', 'сол', 'мол', 'яйц', 'сах', 'ка'))
+        self.request('GET', f'/api/ingredients/?{urlencode({"name": name})}',
+                     '/api/ingredients/?name=')
+
+    def toggle(self, path, label):
+        """Добавление объекта, а если он уже добавлен - удаление."""
+        status, _ = self.request('POST', path, label)
+        if status == 400:
+            self.request('DELETE', path, label)
+
+    def toggle_favorite(self):
+        if self.recipe_ids:
+            recipe_id = self.random.choice(self.recipe_ids)
+            self.toggle(f'/api/recipes/{recipe_id}/favorite/',
+                        '/api/recipes/{id}/favorite/')
+
+    def toggle_subscription(self):
+        if self.author_ids:
+            author_id = self.random.choice(self.author_ids)
+            self.toggle(f'/api/users/{author_id}/subscribe/',
+                        '/api/users/{id}/subscribe/')
+
+    def view_subscriptions(self):
+        self.request('GET', '/api/users/subscriptions/?recipes_limit=3',
+                     '/api/users/subscriptions/')
+
+    def toggle_shopping_cart(self):
+        if self.recipe_ids:
+            recipe_id = self.random.choice(self.recipe_ids)
+            self.toggle(f'/api/recipes/{recipe_id}/shopping_cart/',
+                        '/api/recipes/{id}/shopping_cart/')
+
+    def download_shopping_cart(self):
+        self.request('GET', '/api/recipes/download_shopping_cart/',
+                     '/api/recipes/download_shopping_cart/')
+
+    def run(self):
+        self.login()
+        _, tags = self.request('GET', '/api/tags/', '/api/tags/')
+        self.tags = [tag['slug'] for tag in tags or ()]
+        self.browse_feed()
+        scenarios = self.options.scenarios
+        weights = [SCENARIOS[scenario] for scenario in scenarios]
+        while time.monotonic() < self.deadline:
+            scenario = self.random.choices(scenarios, weights)[0]
+            getattr(self, scenario)()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='http://localhost:8000',
+                        help='Адрес сервера')
+    parser.add_argument('--users', type=int, default=10,
+                        help='Количество одновременных пользователей')
+    parser.add_argument('--accounts', type=int, default=1000,
+                        help='Количество сгенерированных учётных записей, '
+                             'под которыми входят пользователи')
+    parser.add_argument('--password', default='foodhelper',
+                        help='Пароль сгенерированных пользователей')
+    parser.add_argument('--duration', type=float, default=60,
+                        help='Длительность теста в секундах')
+    parser.add_argument('--pages', type=int, default=20,
+                        help='Количество просматриваемых страниц ленты')
+    parser.add_argument('--timeout', type=float, default=30,
+                        help='Таймаут запроса в секундах')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS,
+                        default=list(SCENARIOS),
+                        help='Выполняемые сценарии, по умолчанию все')
+    parser.add_argument('--seed', type=int, default=19,
+                        help='Начальное значение генератора случайных чисел')
+    options = parser.parse_args()
+    stats = Stats()
+    started = time.monotonic()
+    users = [VirtualUser(options, index, stats, started + options.duration)
+             for index in range(options.users)]
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    print(stats.report(time.monotonic() - started))
+
+
+if __name__ == '__main__':
+    main()
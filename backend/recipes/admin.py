@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 from .models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                     ShoppingList, Tag, TagRecipe)
+                     ShoppingCartIngredient, ShoppingList, Tag, TagRecipe)
 
 admin.site.site_title = 'Админ-панель сайта FoodHelper'
 admin.site.site_header = 'Админ-панель сайта FoodHelper'
@@ -19,6 +19,13 @@ class ShoppingListAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'recipe')
 
 
+@admin.register(ShoppingCartIngredient)
+class ShoppingCartIngredientAdmin(admin.ModelAdmin):
+    """Отображение сводного списка покупок."""
+    list_display = ('id', 'user', 'ingredient', 'amount')
+    list_filter = ('user',)
+
+
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     """Отображение ингредиентов."""
@@ -0,0 +1,27 @@
+import time
+
+from django.core.cache import cache
+
+GENERATION_KEY = 'generation:{}'
+
+
+def get_generation(name):
+    """
+    Текущее значение счётчика изменений данных name. Если счётчика нет
+    в кэше, он создаётся со значением от текущего времени, чтобы не
+    повторить значение, выданное до очистки кэша.
+    """
+    key = GENERATION_KEY.format(name)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(name):
+    """Увеличение счётчика изменений данных name."""
+    try:
+        return cache.incr(GENERATION_KEY.format(name))
+    except ValueError:
+        return get_generation(name)
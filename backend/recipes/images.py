@@ -0,0 +1,105 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from .cache import bump_generation
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (600, 600)
+
+THUMBNAIL_FORMATS = {
+    'thumbnail': ('JPEG', 'jpg', {'quality': 80, 'optimize': True,
+                                  'progressive': True}),
+    'thumbnail_webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+}
+
+executor = ThreadPoolExecutor(max_workers=settings.RECIPE_IMAGE_WORKERS,
+                              thread_name_prefix='recipe-images')
+
+
+def render_thumbnail(image, format, options):
+    """Сохранение изображения в формате format, JPEG - на белом фоне."""
+    if format == 'JPEG':
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    output = io.BytesIO()
+    image.save(output, format, **options)
+    return output.getvalue()
+
+
+def delete_files(storage, names):
+    """Удаление файлов names из storage, пустые имена пропускаются."""
+    for name in names:
+        if name:
+            storage.delete(name)
+
+
+def delete_thumbnails(recipe):
+    """
+    Удаление файлов миниатюр рецепта после фиксации текущей транзакции,
+    например при замене изображения. При откате транзакции файлы остаются.
+    """
+    storage = recipe.thumbnail.storage
+    names = [getattr(recipe, field).name for field in THUMBNAIL_FORMATS]
+    transaction.on_commit(lambda: delete_files(storage, names))
+
+
+def make_thumbnails(recipe_id):
+    """
+    Создание уменьшенных копий изображения рецепта во всех форматах
+    THUMBNAIL_FORMATS. Миниатюры сохраняются, только если изображение
+    и миниатюры рецепта не изменились, пока создавались копии; тогда
+    файлы прежних миниатюр удаляются, а иначе удаляются новые файлы.
+    """
+    recipe = Recipe.objects.only('image', *THUMBNAIL_FORMATS).get(
+        pk=recipe_id
+    )
+    with recipe.image.open('rb') as file, Image.open(file) as image:
+        image = ImageOps.exif_transpose(image).convert('RGBA')
+    image.thumbnail(THUMBNAIL_SIZE, Image.LANCZOS)
+    name = os.path.splitext(os.path.basename(recipe.image.name))[0]
+    old_thumbnails = {field: getattr(recipe, field).name
+                      for field in THUMBNAIL_FORMATS}
+    thumbnails = {}
+    for field, (format, extension, options) in THUMBNAIL_FORMATS.items():
+        thumbnail = getattr(recipe, field)
+        thumbnail.save(f'{name}.{extension}', ContentFile(
+            render_thumbnail(image, format, options)
+        ), save=False)
+        thumbnails[field] = thumbnail.name
+    storage = recipe.thumbnail.storage
+    if Recipe.objects.filter(
+        pk=recipe_id, image=recipe.image.name, **old_thumbnails
+    ).update(**thumbnails):
+        delete_files(storage, old_thumbnails.values())
+        bump_generation('recipes')
+    else:
+        delete_files(storage, thumbnails.values())
+
+
+def make_thumbnails_in_background(recipe_id):
+    """Создание миниатюр в потоке executor с закрытием его соединений."""
+    try:
+        make_thumbnails(recipe_id)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры рецепта %s',
+                         recipe_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_thumbnails(recipe):
+    """Создание миниатюр в фоне после фиксации текущей транзакции."""
+    recipe_id = recipe.pk
+    transaction.on_commit(
+        lambda: executor.submit(make_thumbnails_in_background, recipe_id)
+    )
@@ -1,26 +1,156 @@
+import csv
+import io
+import itertools
 import json
+import os
+import time
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from recipes.cache import bump_generation
 from recipes.models import Ingredient
 
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), 'ingredients.json')
+
+CHUNK_SIZE = 64 * 1024
+
+IMPORT_TABLE = 'ingredient_import'
+
+
+def read_csv(file):
+    """Пары (название, единица измерения) из строк CSV."""
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1]
+
+
+def read_json(file):
+    """
+    Пары (название, единица измерения) из массива объектов JSON.
+    Файл читается частями по CHUNK_SIZE, а не загружается целиком.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while True:
+        chunk = file.read(CHUNK_SIZE)
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in '[, \t\r\n':
+                position += 1
+            if position == len(buffer) or buffer[position] == ']':
+                break
+            try:
+                data, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break
+            yield data['name'], data['measurement_unit']
+        buffer = buffer[position:]
+        if not chunk:
+            return
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
 
 class Command(BaseCommand):
 
-    help = 'Импорт ингредиентов из ingredients.json'
+    help = ('Импорт ингредиентов из CSV или JSON. Уже загруженные '
+            'ингредиенты пропускаются, поэтому команду можно запускать '
+            'при каждом деплое')
 
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=DEFAULT_PATH,
+                            help='Путь к файлу .csv или .json')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество ингредиентов в одной вставке')
+
+    def copy_batch(self, cursor, rows):
+        """
+        Загрузка пачки в PostgreSQL через COPY во временную таблицу
+        и вставка из неё с пропуском существующих ингредиентов.
+        """
+        data = io.StringIO()
+        csv.writer(data).writerows(rows)
+        data.seek(0)
+        cursor.copy_expert(
+            f'COPY {IMPORT_TABLE} (name, measurement_unit) '
+            f'FROM STDIN WITH (FORMAT csv)', data
+        )
+        cursor.execute(
+            f'INSERT INTO {Ingredient._meta.db_table} '
+            f'(name, measurement_unit) '
+            f'SELECT name, measurement_unit FROM {IMPORT_TABLE} '
+            f'ON CONFLICT (name, measurement_unit) DO NOTHING'
+        )
+        cursor.execute(f'TRUNCATE {IMPORT_TABLE}')
+
+    def create_batch(self, cursor, rows):
+        """Вставка пачки с пропуском существующих ингредиентов."""
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=measurement_unit)
+             for name, measurement_unit in rows],
+            ignore_conflicts=True
+        )
+
+    def load(self, rows, batch_size):
+        """
+        Загрузка пар из rows пачками, возвращает количество пар. Временная
+        таблица удаляется после загрузки, а не только при фиксации
+        транзакции, чтобы команду можно было вызвать повторно внутри
+        внешней транзакции.
+        """
+        postgresql = connection.vendor == 'postgresql'
+        with connection.cursor() as cursor:
+            load_batch = self.create_batch
+            if postgresql:
+                cursor.execute(
+                    f'CREATE TEMPORARY TABLE {IMPORT_TABLE} '
+                    f'(name varchar(200), measurement_unit varchar(200)) '
+                    f'ON COMMIT DROP'
+                )
+                load_batch = self.copy_batch
+            count = 0
+            while True:
+                batch = list(itertools.islice(rows, batch_size))
+                if not batch:
+                    break
+                load_batch(cursor, batch)
+                count += len(batch)
+            if postgresql:
+                cursor.execute(f'DROP TABLE {IMPORT_TABLE}')
+        return count
+
+    @transaction.atomic
     def handle(self, *args, **kwargs):
-        with open('./recipes/management/commands/ingredients.json',
-                  encoding='utf8') as file:
-            self.stdout.write('Загрузка ингредиентов в базу данных...')
-            Ingredient.objects.bulk_create(
-                [Ingredient(
-                    name=data['name'],
-                    measurement_unit=data['measurement_unit']
-                ) for data in json.load(file)]
-            )
+        path = kwargs['path']
+        reader = READERS.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы .csv и .json')
+        started = time.monotonic()
+        existing = Ingredient.objects.count()
+        self.stdout.write('Загрузка ингредиентов в базу данных...')
+        try:
+            with open(path, encoding='utf8', newline='') as file:
+                rows = ((name.strip(), measurement_unit.strip())
+                        for name, measurement_unit in reader(file))
+                count = self.load(rows, kwargs['batch_size'])
+        except (OSError, ValueError, KeyError, IndexError, TypeError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+        created = Ingredient.objects.count() - existing
+        if created:
+            bump_generation('ingredients')
+        elapsed = time.monotonic() - started
         self.stdout.write(
             self.style.SUCCESS(
-                'Загрузка ингредиентов произошла успешно!'
+                f'Загрузка ингредиентов произошла успешно! Прочитано: '
+                f'{count}, добавлено: {created}, за {elapsed:.2f}с '
+                f'({count / elapsed:.0f} строк в секунду)'
             )
         )
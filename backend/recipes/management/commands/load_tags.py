@@ -2,6 +2,7 @@ import json
 
 from django.core.management.base import BaseCommand
 
+from recipes.cache import bump_generation
 from recipes.models import Tag
 
 
@@ -20,6 +21,7 @@ class Command(BaseCommand):
                     slug=data['slug']
                 ) for data in json.load(file)]
             )
+        bump_generation('tags')
         self.stdout.write(
             self.style.SUCCESS(
                 'Загрузка тегов произошла успешно!'
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import make_thumbnails
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+
+    help = 'Создание миниатюр изображений рецептов, у которых их нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Пересоздать миниатюры всех рецептов')
+
+    def handle(self, *args, **kwargs):
+        recipes = Recipe.objects.exclude(image='')
+        if not kwargs['all']:
+            recipes = recipes.filter(thumbnail='')
+        self.stdout.write('Создание миниатюр...')
+        count = 0
+        for recipe_id in recipes.values_list('pk', flat=True).iterator():
+            make_thumbnails(recipe_id)
+            count += 1
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Создание миниатюр произошло успешно! Рецептов: {count}'
+            )
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import ShoppingCartIngredient
+from users.models import User
+
+
+class Command(BaseCommand):
+
+    help = 'Пересчёт сводных списков покупок всех пользователей'
+
+    @transaction.atomic
+    def handle(self, *args, **kwargs):
+        self.stdout.write('Пересчёт списков покупок...')
+        ShoppingCartIngredient.objects.rebuild(User.objects.all())
+        self.stdout.write(
+            self.style.SUCCESS(
+                'Пересчёт списков покупок произошёл успешно!'
+            )
+        )
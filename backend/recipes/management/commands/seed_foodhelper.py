@@ -0,0 +1,244 @@
+import base64
+import itertools
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.cache import bump_generation
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCartIngredient, ShoppingList, Tag,
+                            TagRecipe)
+from users.models import Follow, User
+
+USERNAME_PREFIX = 'seed_'
+
+SEED_IMAGE = 'recipes/images/seed.png'
+
+SEED_IMAGE_DATA = (
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAQMAAAAl21bKAAAAA1BMVEUAAACnej3aAAAAAXRS'
+    'TlMAQObYZgAAAApJREFUCNdjYAAAAAIAAeIhvDMAAAAASUVORK5CYII='
+)
+
+FIRST_NAMES = ('Анна', 'Иван', 'Мария', 'Пётр', 'Ольга', 'Сергей', 'Елена',
+               'Дмитрий', 'Татьяна', 'Алексей')
+
+LAST_NAMES = ('Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов',
+              'Лебедев', 'Козлов', 'Новиков', 'Морозов', 'Волков')
+
+DISHES = ('Салат', 'Суп', 'Рагу', 'Пирог', 'Омлет', 'Запеканка', 'Каша',
+          'Паста', 'Плов', 'Котлеты', 'Блины', 'Жаркое')
+
+ADJECTIVES = ('домашний', 'летний', 'быстрый', 'праздничный', 'острый',
+              'постный', 'сытный', 'лёгкий')
+
+
+def zipf_weights(count):
+    """
+    Накопленные веса распределения Ципфа для count объектов: первый
+    объект выбирается вдвое чаще второго, втрое чаще третьего и т. д.
+    """
+    return list(itertools.accumulate(
+        1 / rank for rank in range(1, count + 1)
+    ))
+
+
+class Command(BaseCommand):
+
+    help = ('Генерация пользователей, рецептов, подписок, избранного '
+            'и списков покупок для проверки производительности')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000,
+                            help='Количество пользователей')
+        parser.add_argument('--recipes', type=int, default=10000,
+                            help='Количество рецептов')
+        parser.add_argument('--tags', type=int, default=0,
+                            help='Общее количество тегов: недостающие теги '
+                                 'создаются перед генерацией рецептов')
+        parser.add_argument('--followings', type=int, default=10,
+                            help='Среднее количество подписок пользователя')
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Среднее количество избранных рецептов '
+                                 'пользователя')
+        parser.add_argument('--cart', type=int, default=3,
+                            help='Среднее количество рецептов в списке '
+                                 'покупок пользователя')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Количество объектов в одном INSERT')
+        parser.add_argument('--seed', type=int, default=19,
+                            help='Начальное значение генератора случайных '
+                                 'чисел')
+        parser.add_argument('--password', default='foodhelper',
+                            help='Пароль всех пользователей')
+
+    def log(self, message):
+        self.stdout.write(f'{time.monotonic() - self.started:7.1f}с '
+                          f'{message}')
+
+    def bulk_create(self, model, objs):
+        """Создание объектов пачками по batch_size."""
+        objs = iter(objs)
+        created = 0
+        while True:
+            batch = list(itertools.islice(objs, self.batch_size))
+            if not batch:
+                return created
+            model.objects.bulk_create(batch)
+            created += len(batch)
+
+    def sample(self, population, cum_weights, count, exclude=None):
+        """
+        До count различных объектов population, выбранных с весами
+        cum_weights, без объекта exclude.
+        """
+        chosen = dict.fromkeys(
+            self.random.choices(population, cum_weights=cum_weights,
+                                k=count)
+        )
+        chosen.pop(exclude, None)
+        return chosen
+
+    def create_users(self, count, password):
+        """Пользователи с одинаковым паролем, хэш которого считается раз."""
+        password = make_password(password)
+        self.bulk_create(User, (
+            User(username=f'{USERNAME_PREFIX}{index}',
+                 email=f'{USERNAME_PREFIX}{index}@example.com',
+                 first_name=self.random.choice(FIRST_NAMES),
+                 last_name=self.random.choice(LAST_NAMES),
+                 password=password)
+            for index in range(count)
+        ))
+        return list(User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def create_tags(self, count):
+        """Теги с номерами, дополняющие загруженные теги до count."""
+        existing = Tag.objects.count()
+        Tag.objects.bulk_create(
+            Tag(name=f'Тег {index}', color=f'#{index:06x}',
+                slug=f'{USERNAME_PREFIX}tag_{index}')
+            for index in range(existing, count)
+        )
+        return max(count - existing, 0)
+
+    def create_recipes(self, count, author_ids):
+        """
+        Рецепты, чаще всего написанные популярными авторами, с тегами
+        и ингредиентами, часто встречающиеся из которых выбираются чаще.
+        """
+        if not default_storage.exists(SEED_IMAGE):
+            default_storage.save(SEED_IMAGE, ContentFile(
+                base64.b64decode(SEED_IMAGE_DATA)
+            ))
+        author_weights = zipf_weights(len(author_ids))
+        tag_ids = list(Tag.objects.values_list('pk', flat=True))
+        tag_weights = zipf_weights(len(tag_ids))
+        ingredient_ids = list(Ingredient.objects.order_by('pk').values_list(
+            'pk', flat=True
+        ))
+        self.random.shuffle(ingredient_ids)
+        ingredient_weights = zipf_weights(len(ingredient_ids))
+        recipe_ids = []
+        for start in range(0, count, self.batch_size):
+            stop = min(start + self.batch_size, count)
+            recipes = Recipe.objects.bulk_create([
+                Recipe(
+                    author_id=self.random.choices(
+                        author_ids, cum_weights=author_weights
+                    )[0],
+                    name=(f'{self.random.choice(DISHES)} '
+                          f'{self.random.choice(ADJECTIVES)} №{index}'),
+                    text=f'Рецепт №{index}, сгенерированный для проверки '
+                         f'производительности.',
+                    cooking_time=self.random.randint(5, 180),
+                    image=SEED_IMAGE
+                ) for index in range(start, stop)
+            ])
+            TagRecipe.objects.bulk_create([
+                TagRecipe(recipe=recipe, tag_id=tag_id)
+                for recipe in recipes
+                for tag_id in self.sample(tag_ids, tag_weights,
+                                          self.random.randint(1, 3))
+            ])
+            self.bulk_create(IngredientRecipe, (
+                IngredientRecipe(recipe=recipe, ingredient_id=ingredient_id,
+                                 amount=self.random.randint(1, 500))
+                for recipe in recipes
+                for ingredient_id in self.sample(
+                    ingredient_ids, ingredient_weights,
+                    self.random.randint(3, 12)
+                )
+            ))
+            recipe_ids.extend(recipe.pk for recipe in recipes)
+        return recipe_ids
+
+    def create_relations(self, model, user_ids, ids, weights, mean, field,
+                         exclude_self=False):
+        """
+        Связи пользователей с объектами ids: в среднем mean связей на
+        пользователя, популярные объекты выбираются чаще.
+        """
+        return self.bulk_create(model, (
+            model(user_id=user_id, **{field: pk})
+            for user_id in user_ids
+            for pk in self.sample(ids, weights,
+                                  self.random.randint(0, 2 * mean),
+                                  user_id if exclude_self else None)
+        ))
+
+    @transaction.atomic
+    def handle(self, *args, **kwargs):
+        self.started = time.monotonic()
+        self.random = random.Random(kwargs['seed'])
+        self.batch_size = kwargs['batch_size']
+        if User.objects.filter(username__startswith=USERNAME_PREFIX).exists():
+            raise CommandError('Тестовые данные уже сгенерированы')
+        if not Tag.objects.exists() or not Ingredient.objects.exists():
+            raise CommandError('Сначала загрузите теги и ингредиенты '
+                               'командами load_tags и load_ingredients')
+        created = self.create_tags(kwargs['tags'])
+        if created:
+            self.log(f'Тегов: {created}')
+        user_ids = self.create_users(kwargs['users'], kwargs['password'])
+        self.log(f'Пользователей: {len(user_ids)}')
+        authors = user_ids[:]
+        self.random.shuffle(authors)
+        recipe_ids = self.create_recipes(kwargs['recipes'], authors)
+        self.log(f'Рецептов: {len(recipe_ids)}')
+        author_weights = zipf_weights(len(authors))
+        created = self.create_relations(
+            Follow, user_ids, authors, author_weights, kwargs['followings'],
+            'following_id', exclude_self=True
+        )
+        self.log(f'Подписок: {created}')
+        popular_recipes = recipe_ids[:]
+        self.random.shuffle(popular_recipes)
+        recipe_weights = zipf_weights(len(popular_recipes))
+        created = self.create_relations(
+            Favorite, user_ids, popular_recipes, recipe_weights,
+            kwargs['favorites'], 'recipe_id'
+        )
+        self.log(f'Избранных рецептов: {created}')
+        created = self.create_relations(
+            ShoppingList, user_ids, popular_recipes, recipe_weights,
+            kwargs['cart'], 'recipe_id'
+        )
+        self.log(f'Рецептов в списках покупок: {created}')
+        for start in range(0, len(user_ids), self.batch_size):
+            ShoppingCartIngredient.objects.rebuild(
+                user_ids[start:start + self.batch_size]
+            )
+        self.log('Сводные списки покупок пересчитаны')
+        bump_generation('recipes')
+        self.stdout.write(
+            self.style.SUCCESS(
+                'Генерация тестовых данных произошла успешно!'
+            )
+        )
@@ -0,0 +1,115 @@
+# Generated by Django 4.1 on 2026-10-18 02:08
+
+from django.contrib.postgres.operations import TrigramExtension
+import django.contrib.postgres.search
+from django.db import migrations, transaction
+
+FILL_BATCH_SIZE = 5000
+
+SEARCH_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION recipes_recipe_search_vector_update()
+RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce(NEW.text, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS recipes_recipe_search_vector_trigger ON recipes_recipe;
+CREATE TRIGGER recipes_recipe_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe
+    FOR EACH ROW EXECUTE FUNCTION recipes_recipe_search_vector_update();
+"""
+
+REVERSE_SEARCH_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS recipes_recipe_search_vector_trigger ON recipes_recipe;
+DROP FUNCTION IF EXISTS recipes_recipe_search_vector_update();
+"""
+
+FILL_SEARCH_VECTOR_SQL = """
+UPDATE recipes_recipe SET name = name
+WHERE id BETWEEN %s AND %s AND search_vector IS NULL
+"""
+
+SEARCH_INDEXES_SQL = (
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS recipes_ingredient_name_trgm "
+    "ON recipes_ingredient USING gin (UPPER(name::text) gin_trgm_ops)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS recipes_recipe_name_trgm "
+    "ON recipes_recipe USING gin (UPPER(name::text) gin_trgm_ops)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS recipes_recipe_search_vector "
+    "ON recipes_recipe USING gin (search_vector)",
+)
+
+REVERSE_SEARCH_INDEXES_SQL = (
+    "DROP INDEX CONCURRENTLY IF EXISTS recipes_recipe_search_vector",
+    "DROP INDEX CONCURRENTLY IF EXISTS recipes_recipe_name_trgm",
+    "DROP INDEX CONCURRENTLY IF EXISTS recipes_ingredient_name_trgm",
+)
+
+
+def create_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(SEARCH_TRIGGER_SQL)
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(REVERSE_SEARCH_TRIGGER_SQL)
+
+
+def fill_search_vector(apps, schema_editor):
+    """
+    Заполнение search_vector существующих рецептов триггером, пачками
+    по FILL_BATCH_SIZE строк в отдельных транзакциях: таблица не
+    блокируется на всё время заполнения, а прерванную миграцию можно
+    продолжить с незаполненных строк.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT min(id), max(id) FROM recipes_recipe")
+        first_id, last_id = cursor.fetchone()
+        if first_id is None:
+            return
+        for start in range(first_id, last_id + 1, FILL_BATCH_SIZE):
+            with transaction.atomic(using=connection.alias):
+                cursor.execute(FILL_SEARCH_VECTOR_SQL,
+                               (start, start + FILL_BATCH_SIZE - 1))
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        for sql in SEARCH_INDEXES_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        for sql in REVERSE_SEARCH_INDEXES_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+    # Индексы создаются с CONCURRENTLY, а search_vector заполняется
+    # пачками, поэтому миграция выполняется вне общей транзакции.
+    atomic = False
+
+    dependencies = [
+        ("recipes", "0003_shoppingcartingredient"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="recipe",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True, verbose_name="Поисковый вектор"
+            ),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+        migrations.RunPython(fill_search_vector, migrations.RunPython.noop),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.1 on 2026-10-18 02:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0005_recipe_pub_date_id_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="tagrecipe",
+            index=models.Index(
+                fields=["recipe", "tag"], name="tagrecipe_recipe_tag_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.1 on 2026-10-18 02:17
+
+from django.db import migrations, models
+
+PREFIX_INDEX_SQL = """
+CREATE INDEX recipes_ingredient_name_prefix
+    ON recipes_ingredient (UPPER(name::text) text_pattern_ops);
+"""
+
+REVERSE_PREFIX_INDEX_SQL = """
+DROP INDEX recipes_ingredient_name_prefix;
+"""
+
+
+def create_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(PREFIX_INDEX_SQL)
+
+
+def drop_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(REVERSE_PREFIX_INDEX_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0006_tagrecipe_recipe_tag_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["author", "-pub_date", "-id"],
+                name="recipe_author_pub_date_id_idx",
+            ),
+        ),
+        migrations.RunPython(create_prefix_index, drop_prefix_index),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.1 on 2026-10-18 02:21
+
+from django.db import migrations, models
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model("recipes", "Ingredient")
+    duplicates = (
+        Ingredient.objects.values("name", "measurement_unit")
+        .annotate(keep_id=models.Min("id"), count=models.Count("id"))
+        .filter(count__gt=1)
+    )
+    for group in duplicates:
+        keep_id = group["keep_id"]
+        removed = Ingredient.objects.filter(
+            name=group["name"], measurement_unit=group["measurement_unit"]
+        ).exclude(pk=keep_id)
+        for model_name, owner in (
+            ("IngredientRecipe", "recipe_id"),
+            ("ShoppingCartIngredient", "user_id"),
+        ):
+            model = apps.get_model("recipes", model_name)
+            for row in list(model.objects.filter(ingredient__in=removed)):
+                kept = model.objects.filter(
+                    ingredient_id=keep_id, **{owner: getattr(row, owner)}
+                ).first()
+                if kept is None:
+                    row.ingredient_id = keep_id
+                    row.save(update_fields=["ingredient"])
+                else:
+                    kept.amount += row.amount
+                    kept.save(update_fields=["amount"])
+                    row.delete()
+        removed.delete()
+    if schema_editor.connection.vendor == "postgresql":
+        # Отложенные проверки внешних ключей после удаления строк
+        # выполняются сейчас: иначе ALTER TABLE в той же транзакции
+        # завершается ошибкой "pending trigger events".
+        schema_editor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0007_hot_query_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="ingredient",
+            constraint=models.UniqueConstraint(
+                fields=("name", "measurement_unit"), name="Уникальный ингредиент"
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.1 on 2026-10-18 02:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0008_ingredient_unique"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="thumbnail",
+            field=models.ImageField(
+                blank=True,
+                editable=False,
+                upload_to="recipes/thumbnails/",
+                verbose_name="Миниатюра JPEG",
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="thumbnail_webp",
+            field=models.ImageField(
+                blank=True,
+                editable=False,
+                upload_to="recipes/thumbnails/",
+                verbose_name="Миниатюра WebP",
+            ),
+        ),
+    ]
@@ -1,8 +1,40 @@
 from colorfield.fields import ColorField
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVectorField,
+                                            TrigramSimilarity)
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import connections, models, transaction
 
-from users.models import User
+from users.models import Follow, User
+
+SEARCH_CONFIG = 'russian'
+
+
+def is_postgresql(queryset):
+    """Проверка, выполняется ли запрос в PostgreSQL."""
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+class IngredientQuerySet(models.QuerySet):
+    """Запросы к ингредиентам."""
+
+    def search(self, name):
+        """
+        Ингредиенты, в названии которых встречается name. Первыми идут
+        названия, начинающиеся с name, затем остальные по убыванию
+        триграммного сходства в PostgreSQL или по алфавиту в других СУБД.
+        """
+        queryset = self.filter(name__icontains=name).annotate(
+            is_prefix=models.Case(
+                models.When(name__istartswith=name, then=models.Value(True)),
+                default=models.Value(False)
+            )
+        )
+        if is_postgresql(self):
+            return queryset.annotate(
+                rank=TrigramSimilarity('name', name)
+            ).order_by('-is_prefix', '-rank', 'name')
+        return queryset.order_by('-is_prefix', 'name')
 
 
 class Ingredient(models.Model):
@@ -10,9 +42,17 @@ class Ingredient(models.Model):
     name = models.CharField('Название ингредиента', max_length=200)
     measurement_unit = models.CharField('Единица измерения', max_length=200)
 
+    objects = IngredientQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='Уникальный ингредиент',
+            ),
+        )
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
@@ -38,6 +78,73 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Запросы к рецептам."""
+
+    def for_feed(self, user):
+        """
+        Рецепты для вывода через RecipeReadMaxSerializer: теги, ингредиенты
+        и автор загружаются заранее, флаги избранного, списка покупок и
+        подписки на автора вычисляются подзапросами EXISTS.
+        """
+        queryset = self.defer('search_vector').prefetch_related(
+            models.Prefetch('tags', queryset=Tag.objects.all()),
+            models.Prefetch(
+                'ingredient_recipe',
+                queryset=IngredientRecipe.objects.select_related('ingredient')
+            )
+        )
+        if not user.is_authenticated:
+            return queryset.select_related('author').annotate(
+                is_favorited=models.Value(False),
+                is_in_shopping_cart=models.Value(False)
+            )
+        authors = User.objects.annotate(is_subscribed=models.Exists(
+            Follow.objects.filter(user=user, following=models.OuterRef('pk'))
+        ))
+        return queryset.prefetch_related(
+            models.Prefetch('author', queryset=authors)
+        ).annotate(
+            is_favorited=models.Exists(Favorite.objects.filter(
+                user=user, recipe=models.OuterRef('pk')
+            )),
+            is_in_shopping_cart=models.Exists(ShoppingList.objects.filter(
+                user=user, recipe=models.OuterRef('pk')
+            ))
+        )
+
+    def search(self, text):
+        """
+        Поиск рецептов по названию и описанию с сортировкой по релевантности.
+        В PostgreSQL используется полнотекстовый поиск по search_vector
+        и триграммное сходство названия, в других СУБД - поиск подстроки.
+        """
+        if not is_postgresql(self):
+            return self.filter(
+                models.Q(name__icontains=text) | models.Q(text__icontains=text)
+            ).annotate(rank=models.Case(
+                models.When(name__istartswith=text, then=models.Value(2)),
+                models.When(name__icontains=text, then=models.Value(1)),
+                default=models.Value(0)
+            )).order_by('-rank', '-pub_date')
+        query = SearchQuery(text, config=SEARCH_CONFIG,
+                            search_type='websearch')
+        return self.filter(
+            models.Q(search_vector=query) | models.Q(name__icontains=text)
+        ).annotate(
+            rank=SearchRank(models.F('search_vector'), query)
+            + TrigramSimilarity('name', text)
+        ).order_by('-rank', '-pub_date')
+
+    def first_per_author(self, limit):
+        """Не более limit последних рецептов каждого автора."""
+        return self.filter(pk__in=models.Subquery(
+            self.model.objects.filter(
+                author=models.OuterRef('author')
+            ).values('pk')[:limit]
+        ))
+
+
 class Recipe(models.Model):
     """Рецепты."""
     author = models.ForeignKey(User,
@@ -54,6 +161,12 @@ class Recipe(models.Model):
                                   verbose_name='Теги')
     image = models.ImageField('Изображение блюда',
                               upload_to='recipes/images/')
+    thumbnail = models.ImageField('Миниатюра JPEG',
+                                  upload_to='recipes/thumbnails/',
+                                  blank=True, editable=False)
+    thumbnail_webp = models.ImageField('Миниатюра WebP',
+                                       upload_to='recipes/thumbnails/',
+                                       blank=True, editable=False)
     name = models.CharField('Название блюда',
                             max_length=200)
     text = models.TextField('Описание блюда')
@@ -67,11 +180,21 @@ class Recipe(models.Model):
         )
     )
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    search_vector = SearchVectorField('Поисковый вектор', null=True,
+                                      editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = (
+            models.Index(fields=('-pub_date', '-id'),
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=('author', '-pub_date', '-id'),
+                         name='recipe_author_pub_date_id_idx'),
+        )
 
     def __str__(self):
         return self.name
@@ -130,6 +253,10 @@ class TagRecipe(models.Model):
                 name='Уникальный тег для рецепта',
             ),
         )
+        indexes = (
+            models.Index(fields=('recipe', 'tag'),
+                         name='tagrecipe_recipe_tag_idx'),
+        )
 
     def __str__(self):
         return f'Тег - {self.tag} для {self.recipe}'
@@ -183,3 +310,120 @@ class Favorite(models.Model):
 
     def __str__(self):
         return f'У {self.user} в избранном {self.recipe}'
+
+
+class ShoppingCartQuerySet(models.QuerySet):
+    """Поддержка сводного списка покупок в актуальном состоянии."""
+
+    @transaction.atomic
+    def change_amounts(self, user_ids, amounts):
+        """
+        Изменение количества ингредиентов в списках покупок пользователей
+        на величины из словаря {id ингредиента: изменение количества}.
+        Строки пользователей блокируются до конца транзакции, поэтому
+        метод открывает её сам: он вызывается из сигналов, в том числе
+        вне транзакции, например из shell или команд.
+        """
+        amounts = {pk: amount for pk, amount in amounts.items() if amount}
+        user_ids = list(user_ids)
+        if not amounts or not user_ids:
+            return
+        list(User.objects.select_for_update().filter(pk__in=user_ids))
+        rows = self.filter(user_id__in=user_ids, ingredient_id__in=amounts)
+        existing = set(rows.values_list('user_id', 'ingredient_id'))
+        if existing:
+            rows.update(amount=models.F('amount') + models.Case(
+                *(models.When(ingredient_id=ingredient_id, then=amount)
+                  for ingredient_id, amount in amounts.items()),
+                output_field=models.IntegerField()
+            ))
+        self.bulk_create(
+            self.model(user_id=user_id, ingredient_id=ingredient_id,
+                       amount=amount)
+            for user_id in user_ids
+            for ingredient_id, amount in amounts.items()
+            if amount > 0 and (user_id, ingredient_id) not in existing
+        )
+        rows.filter(amount__lte=0).delete()
+
+    def add_recipe(self, user_id, recipe_id):
+        """Добавление ингредиентов рецепта в список покупок."""
+        self.change_amounts((user_id,), recipe_amounts(recipe_id))
+
+    def remove_recipe(self, user_id, recipe_id):
+        """Удаление ингредиентов рецепта из списка покупок."""
+        self.change_amounts((user_id,), {
+            pk: -amount for pk, amount in recipe_amounts(recipe_id).items()
+        })
+
+    def update_recipe(self, recipe, old_amounts, new_amounts):
+        """
+        Учёт изменения ингредиентов рецепта или его id в списках покупок
+        всех пользователей, добавивших рецепт.
+        """
+        self.change_amounts(
+            ShoppingList.objects.filter(recipe=recipe).values_list(
+                'user_id', flat=True
+            ),
+            {pk: new_amounts.get(pk, 0) - old_amounts.get(pk, 0)
+             for pk in old_amounts.keys() | new_amounts.keys()}
+        )
+
+    def rebuild(self, users):
+        """Пересчёт списков покупок пользователей с нуля."""
+        self.filter(user__in=users).delete()
+        self.bulk_create(
+            self.model(user_id=row['recipe__shoplist__user'],
+                       ingredient_id=row['ingredient'],
+                       amount=row['sum_amount'])
+            for row in IngredientRecipe.objects
+            .filter(recipe__shoplist__user__in=users)
+            .values('recipe__shoplist__user', 'ingredient')
+            .annotate(sum_amount=models.Sum('amount'))
+        )
+
+
+def recipe_amounts(recipe):
+    """
+    Количество каждого ингредиента рецепта или рецепта с id recipe:
+    {id ингредиента: amount}.
+    """
+    return dict(IngredientRecipe.objects.filter(recipe=recipe).values_list(
+        'ingredient_id', 'amount'
+    ))
+
+
+class ShoppingCartIngredient(models.Model):
+    """
+    Сводный список покупок: суммарное количество каждого ингредиента
+    из всех рецептов в списке покупок пользователя. Обновляется
+    обработчиками сигналов api.signals при сохранении и удалении списков
+    покупок, ингредиентов рецептов и рецептов. QuerySet.update(),
+    bulk_create() и bulk_update() сигналы не отправляют: после них нужно
+    вызвать update_recipe или команду rebuild_shopping_carts.
+    """
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='cart_ingredients',
+                             verbose_name='Пользователь')
+    ingredient = models.ForeignKey(Ingredient,
+                                   on_delete=models.CASCADE,
+                                   related_name='cart_ingredients',
+                                   verbose_name='Ингредиент')
+    amount = models.PositiveIntegerField('Суммарное количество')
+
+    objects = ShoppingCartQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='Уникальный ингредиент в списке покупок',
+            ),
+        )
+
+    def __str__(self):
+        return (f'У {self.user} в списке покупок {self.ingredient.name} '
+                f'{self.amount} {self.ingredient.measurement_unit}')
@@ -0,0 +1,226 @@
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+
+from recipes import images
+from recipes.models import Ingredient, Recipe
+from users.models import User
+
+INGREDIENTS = [
+    ('абрикосы', 'г'),
+    ('молоко', 'мл'),
+    ('молоко', 'г'),
+    (' соль ', 'по вкусу'),
+    ('абрикосы', 'г'),
+]
+
+
+class LoadIngredientsTest(TestCase):
+    """Импорт ингредиентов командой load_ingredients."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.paths = {
+            'json': os.path.join(directory, 'ingredients.json'),
+            'csv': os.path.join(directory, 'ingredients.csv'),
+        }
+        with open(self.paths['json'], 'w', encoding='utf8') as file:
+            json.dump([{'name': name, 'measurement_unit': unit}
+                       for name, unit in INGREDIENTS], file,
+                      ensure_ascii=False, indent=2)
+        with open(self.paths['csv'], 'w', encoding='utf8',
+                  newline='') as file:
+            csv.writer(file).writerows(INGREDIENTS)
+
+    def load(self, path):
+        call_command('load_ingredients', path=path, batch_size=2,
+                     stdout=io.StringIO())
+        return set(Ingredient.objects.values_list('name',
+                                                  'measurement_unit'))
+
+    def test_formats(self):
+        """CSV и JSON дают одинаковые ингредиенты без повторов."""
+        expected = {('абрикосы', 'г'), ('молоко', 'мл'), ('молоко', 'г'),
+                    ('соль', 'по вкусу')}
+        for file_format, path in self.paths.items():
+            with self.subTest(format=file_format):
+                Ingredient.objects.all().delete()
+                self.assertEqual(self.load(path), expected)
+                self.assertEqual(Ingredient.objects.count(), len(expected))
+
+    def test_load_twice(self):
+        """Повторный запуск, в том числе с другим файлом, не создаёт дублей."""
+        self.load(self.paths['json'])
+        count = Ingredient.objects.count()
+        self.load(self.paths['json'])
+        self.load(self.paths['csv'])
+        self.assertEqual(Ingredient.objects.count(), count)
+
+
+class MergeDuplicateIngredientsMigrationTest(TransactionTestCase):
+    """Миграция 0008 объединяет повторяющиеся ингредиенты."""
+    migrate_from = [('recipes', '0007_hot_query_indexes')]
+    migrate_to = [('recipes', '0008_ingredient_unique')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def migrate(self, targets):
+        """Миграция к targets, возвращает состояние моделей после неё."""
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        executor.loader.build_graph()
+        return executor.loader.project_state(targets).apps
+
+    def test_merge(self):
+        """
+        Строки рецептов и списков покупок переносятся на оставшийся
+        ингредиент, при совпадении количества складываются.
+        """
+        apps = self.migrate(self.migrate_from)
+        user_model = apps.get_model('users', 'User')
+        ingredient_model = apps.get_model('recipes', 'Ingredient')
+        recipe_model = apps.get_model('recipes', 'Recipe')
+        ingredient_recipe_model = apps.get_model('recipes',
+                                                 'IngredientRecipe')
+        cart_model = apps.get_model('recipes', 'ShoppingCartIngredient')
+        users = [user_model.objects.create(username=f'user{index}',
+                                           email=f'user{index}@localhost')
+                 for index in range(2)]
+        kept, first, second = [
+            ingredient_model.objects.create(name='молоко',
+                                            measurement_unit='мл')
+            for _ in range(3)
+        ]
+        other = ingredient_model.objects.create(name='молоко',
+                                                measurement_unit='г')
+        recipes = [recipe_model.objects.create(
+            author=users[0], name=f'Рецепт {index}', text='Описание',
+            cooking_time=10, image='recipes/images/recipe.png'
+        ) for index in range(2)]
+        ingredient_recipe_model.objects.bulk_create([
+            ingredient_recipe_model(recipe=recipes[0], ingredient=kept,
+                                    amount=1),
+            ingredient_recipe_model(recipe=recipes[0], ingredient=first,
+                                    amount=2),
+            ingredient_recipe_model(recipe=recipes[0], ingredient=second,
+                                    amount=3),
+            ingredient_recipe_model(recipe=recipes[1], ingredient=second,
+                                    amount=4),
+            ingredient_recipe_model(recipe=recipes[1], ingredient=other,
+                                    amount=5),
+        ])
+        cart_model.objects.bulk_create([
+            cart_model(user=users[0], ingredient=first, amount=10),
+            cart_model(user=users[0], ingredient=second, amount=20),
+            cart_model(user=users[1], ingredient=kept, amount=30),
+            cart_model(user=users[1], ingredient=second, amount=40),
+        ])
+
+        apps = self.migrate(self.migrate_to)
+        ingredient_model = apps.get_model('recipes', 'Ingredient')
+        ingredient_recipe_model = apps.get_model('recipes',
+                                                 'IngredientRecipe')
+        cart_model = apps.get_model('recipes', 'ShoppingCartIngredient')
+        self.assertEqual(
+            set(ingredient_model.objects.values_list('pk', flat=True)),
+            {kept.pk, other.pk}
+        )
+        self.assertEqual(
+            set(ingredient_recipe_model.objects.values_list(
+                'recipe_id', 'ingredient_id', 'amount'
+            )),
+            {(recipes[0].pk, kept.pk, 6), (recipes[1].pk, kept.pk, 4),
+             (recipes[1].pk, other.pk, 5)}
+        )
+        self.assertEqual(
+            set(cart_model.objects.values_list('user_id', 'ingredient_id',
+                                               'amount')),
+            {(users[0].pk, kept.pk, 30), (users[1].pk, kept.pk, 70)}
+        )
+
+
+def make_image(size):
+    """PNG-изображение размера size."""
+    output = io.BytesIO()
+    Image.new('RGBA', size, (200, 100, 50, 128)).save(output, 'PNG')
+    return ContentFile(output.getvalue())
+
+
+class ThumbnailsTest(TestCase):
+    """Создание миниатюр изображения рецепта."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        author = User.objects.create(username='author',
+                                     email='author@localhost')
+        self.recipe = Recipe(author=author, name='Рецепт', text='Описание',
+                             cooking_time=10)
+        self.recipe.image.save('recipe.png', make_image((1200, 800)),
+                               save=False)
+        with self.captureOnCommitCallbacks():
+            self.recipe.save()
+
+    def get_thumbnails(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        return [getattr(recipe, field).name
+                for field in images.THUMBNAIL_FORMATS]
+
+    def test_make_thumbnails(self):
+        """JPEG и WebP не больше THUMBNAIL_SIZE с пропорциями изображения."""
+        images.make_thumbnails(self.recipe.pk)
+        thumbnails = self.get_thumbnails()
+        for name, format in zip(thumbnails, ('JPEG', 'WEBP')):
+            with default_storage.open(name) as file, \
+                    Image.open(file) as image:
+                self.assertEqual(image.format, format)
+                self.assertEqual(image.size, (600, 400))
+
+    def test_old_thumbnails_deleted(self):
+        """При повторном создании файлы прежних миниатюр удаляются."""
+        images.make_thumbnails(self.recipe.pk)
+        old_thumbnails = self.get_thumbnails()
+        images.make_thumbnails(self.recipe.pk)
+        thumbnails = self.get_thumbnails()
+        for old, new in zip(old_thumbnails, thumbnails):
+            self.assertNotEqual(old, new)
+            self.assertFalse(default_storage.exists(old))
+            self.assertTrue(default_storage.exists(new))
+
+    def test_image_replaced_during_creation(self):
+        """
+        Если изображение заменили, пока создавались миниатюры, они
+        не сохраняются в рецепт, а их файлы удаляются.
+        """
+        render_thumbnail = images.render_thumbnail
+
+        def replace_image(*args):
+            Recipe.objects.filter(pk=self.recipe.pk).update(
+                image='recipes/images/other.png'
+            )
+            return render_thumbnail(*args)
+
+        with mock.patch.object(images, 'render_thumbnail', replace_image):
+            images.make_thumbnails(self.recipe.pk)
+        self.assertEqual(self.get_thumbnails(), ['', ''])
+        self.assertEqual(default_storage.listdir('recipes/thumbnails'),
+                         ([], []))